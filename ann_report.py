@@ -0,0 +1,26 @@
+from db.db_class import Company_DB
+from db_config.config import DB_SETTINGS, INDEX_SETTINGS
+from utils.index import evaluate_recall
+
+EF_SEARCH_VALUES = [16, 32, 64, 128, 256]
+
+db = Company_DB(**DB_SETTINGS)
+
+print("✅ Построение HNSW-индекса...")
+
+index = db.load_index(**{**INDEX_SETTINGS, 'backend': 'hnsw'})
+
+print(f"Идей в индексе: {len(index)}")
+if not len(index):
+    raise SystemExit("Таблица ideas пуста — сравнивать нечего.")
+
+print(f"{'ef_search':>10} {'recall@15':>10} {'exact, мс':>10} {'hnsw, мс':>10}")
+
+for ef_search in EF_SEARCH_VALUES:
+    index.set_ef_search(ef_search)
+    report = evaluate_recall(index, k=15)
+    print(f"{ef_search:>10} {report['recall']:>10} {report['exact_ms_per_query']:>10} {report['ann_ms_per_query']:>10}")
+
+db.close()
+
+print("✅ Готово!")
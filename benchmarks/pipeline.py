@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# кэш эмбеддингов отключается: замеряется кодирование, а не попадания в кэш,
+# и векторы заглушки не попадают в постоянный кэш настоящей модели
+os.environ['EMBEDDING_CACHE_ITEMS'] = '0'
+os.environ['EMBEDDING_CACHE_PATH'] = ''
+
+import numpy as np
+from synthetic import StubEncoder, make_ideas, write_csv
+from utils.model_registry import model_registry, DEFAULT_MODEL_NAME
+from utils.transform import (
+    _org_cache, get_key_words, filter_organizations_spacy_batch, get_clean_text,
+    extract_duplicates_and_uniques, smart_grouping
+)
+from utils.embedding import compute_embeddings, cluster_embeddings, match_new_idea_to_old_db
+from db_config.config import CLUSTER_SETTINGS, DB_SETTINGS, POOL_SETTINGS
+
+SIZES = [1_000, 10_000, 100_000]
+EPS = 0.25
+MIN_SAMPLES = 2
+THRESHOLD = 20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк конвейера обработки идей на синтетическом корпусе с детерминированной заглушкой модели"
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="размеры корпуса, идей")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dim', type=int, default=768, help="размерность эмбеддингов заглушки")
+    parser.add_argument('--queries', type=int, default=50, help="число запросов match_new_idea_to_old_db")
+    parser.add_argument('--db', help="строка подключения к отдельной БД для этапов с PostgreSQL, "
+                                     "например 'host=localhost dbname=bench user=myuser password=...'; "
+                                     "таблицы ideas и clusters в ней пересоздаются")
+    parser.add_argument('--no-memory', action='store_true', help="без tracemalloc: точнее время, без пиковой памяти")
+    parser.add_argument('--output', default='pipeline_report.json', help="JSON-отчёт")
+    parser.add_argument('--compare', help="предыдущий JSON-отчёт для сравнения времени этапов")
+    return parser.parse_args()
+
+
+def measure(stages: dict, name: str, fn, *args, **kwargs):
+    """
+    Время этапа и пик памяти Python-аллокаций сверх уже занятой (tracemalloc, если включён)
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+
+    start_time = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start_time
+
+    stages[name] = {"seconds": round(seconds, 4)}
+    if tracing:
+        stages[name]["peak_mb"] = round((tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2, 2)
+    print(f"  {name:<32} {seconds:>10.3f} с" + (f" {stages[name]['peak_mb']:>10} МБ" if tracing else ""))
+    return result
+
+
+def group_clusters(df_clusters, key_words: list[list]) -> int:
+    """
+    smart_grouping внутри кластеров повторов, как в process_clusters; возвращает число подгрупп
+    """
+    positions = {idea_id: i for i, idea_id in enumerate(df_clusters['idea_id'])}
+    duplicate_groups, _ = extract_duplicates_and_uniques(df_clusters)
+    total_subgroups = 0
+    for group in duplicate_groups:
+        token_lists = [key_words[positions[idea_id]] or ['АРГЕС'] for idea_id in group]
+        total_subgroups += len(smart_grouping(token_lists, THRESHOLD))
+    return total_subgroups
+
+
+def run_memory_stages(ideas: list[tuple], stages: dict) -> dict:
+    texts = [f"{title} {description}" for _, title, description in ideas]
+    idea_ids = [idea_id for idea_id, _, _ in ideas]
+
+    _org_cache.clear()
+    raw_key_words = measure(stages, 'get_key_words', get_key_words, texts)
+    key_words = measure(stages, 'filter_organizations_spacy', filter_organizations_spacy_batch, raw_key_words)
+    cleaned_texts = measure(stages, 'get_clean_text', get_clean_text, texts, key_words)
+    embeddings = measure(stages, 'compute_embeddings', compute_embeddings, cleaned_texts)
+    df_clusters = measure(
+        stages, 'cluster_embeddings', cluster_embeddings, idea_ids, embeddings, EPS, MIN_SAMPLES,
+        memory_limit_mb=CLUSTER_SETTINGS['memory_limit_mb'], workers=CLUSTER_SETTINGS['workers']
+    )
+    subgroups = measure(stages, 'smart_grouping', group_clusters, df_clusters, key_words)
+
+    labels = df_clusters['cluster_id']
+    return {
+        "clusters": int(labels[labels != -1].nunique()),
+        "noise": int((labels == -1).sum()),
+        "subgroups": subgroups
+    }
+
+
+def run_db_stages(db, csv_path: str, queries: list[str], stages: dict) -> None:
+    db.init_db_ideas()
+    db.init_db_clusters()
+    _org_cache.clear()
+    measure(stages, 'load_data_from_csv', db.load_data_from_csv, csv_path)
+    measure(stages, 'process_clusters', db.process_clusters, EPS, MIN_SAMPLES, THRESHOLD)
+    measure(stages, 'build_index', lambda: (db.build_index(), db.build_centroids()))
+
+    latencies = []
+    def match_all():
+        for text in queries:
+            start_time = time.perf_counter()
+            match_new_idea_to_old_db(text, db)
+            latencies.append(time.perf_counter() - start_time)
+
+    measure(stages, 'match_new_idea_to_old_db', match_all)
+    stages['match_new_idea_to_old_db'].update({
+        "queries": len(queries),
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3)
+    })
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print(f"\nСравнение с {baseline_path} (commit {baseline.get('git_commit')}):")
+    if baseline.get('memory_traced') != report['memory_traced']:
+        print("Внимание: tracemalloc включён только в одном из отчётов, время этапов несопоставимо")
+    print(f"{'идей':>8} {'этап':<32} {'было, с':>10} {'стало, с':>10} {'×':>7}")
+    for size, run in report['runs'].items():
+        old_run = baseline['runs'].get(size)
+        if old_run is None:
+            continue
+        for name, stage in run['stages'].items():
+            old_stage = old_run['stages'].get(name)
+            if old_stage is None:
+                continue
+            ratio = old_stage['seconds'] / stage['seconds'] if stage['seconds'] else float('inf')
+            print(f"{size:>8} {name:<32} {old_stage['seconds']:>10.3f} {stage['seconds']:>10.3f} {ratio:>7.2f}")
+
+
+def main():
+    args = parse_args()
+
+    # заглушка регистрируется под именем модели по умолчанию: все пути кодирования работают без сети
+    model_registry.register(DEFAULT_MODEL_NAME, StubEncoder(args.dim))
+
+    db = None
+    if args.db:
+        from psycopg2.extensions import parse_dsn
+        from db.db_class import Company_DB
+        db = Company_DB(**{**DB_SETTINGS, **parse_dsn(args.db)}, **POOL_SETTINGS)
+
+    report = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "dim": args.dim,
+        "memory_traced": not args.no_memory,
+        "db": db is not None,
+        "settings": {
+            "eps": EPS,
+            "min_samples": MIN_SAMPLES,
+            "threshold": THRESHOLD,
+            "cluster_memory_limit_mb": CLUSTER_SETTINGS['memory_limit_mb'],
+            "cluster_workers": CLUSTER_SETTINGS['workers']
+        },
+        "runs": {}
+    }
+
+    if not args.no_memory:
+        tracemalloc.start()
+
+    queries = [f"{title} {description}" for _, title, description in make_ideas(args.queries, args.seed + 1)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            print(f"✅ Корпус {size} идей")
+            ideas = make_ideas(size, args.seed)
+            csv_path = os.path.join(tmp_dir, f'synthetic_{size}.csv')
+            write_csv(csv_path, ideas)
+
+            stages = {}
+            run = run_memory_stages(ideas, stages)
+            if db is not None:
+                run_db_stages(db, csv_path, queries, stages)
+            run["stages"] = stages
+            report["runs"][str(size)] = run
+
+    if db is not None:
+        db.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Отчёт записан в {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.transform import smart_grouping
+
+SIZES = [1_000, 10_000, 50_000]
+# попарный эталон выполняется только до этого размера кластера
+REFERENCE_LIMIT = 10_000
+
+
+def reference_grouping(token_lists, threshold=20):
+    """
+    Исходный попарный алгоритм O(n²) для сверки результатов
+    """
+    def similarity(a, b):
+        set_a, set_b = set(a), set(b)
+        intersection = set_a & set_b
+        union = set_a | set_b
+        return 100 * len(intersection) / len(union) if union else 0.0
+
+    token_lists = [tokens if tokens else ['АРГЕС'] for tokens in token_lists]
+    used = [False] * len(token_lists)
+    groups = []
+
+    for i, tokens in enumerate(token_lists):
+        if used[i]:
+            continue
+        group = [i]
+        used[i] = True
+        for j in range(i + 1, len(token_lists)):
+            if not used[j] and similarity(tokens, token_lists[j]) >= threshold:
+                group.append(j)
+                used[j] = True
+        groups.append(group)
+
+    return groups
+
+
+def make_token_lists(n: int, seed: int = 0) -> list[list]:
+    """
+    Ключевые слова участников одного кластера: частые аббревиатуры и коды с распределением Ципфа,
+    часть идей без ключевых слов
+    """
+    rnd = random.Random(seed)
+    vocabulary = [f"КОД-{i}" for i in range(max(200, n // 20))]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    token_lists = []
+    for _ in range(n):
+        k = rnd.choice([0, 1, 2, 3, 3, 4, 5, 6])
+        token_lists.append(rnd.choices(vocabulary, weights=weights, k=k))
+    return token_lists
+
+
+print(f"{'идей':>8} {'подгрупп':>9} {'индекс, с':>10} {'попарно, с':>11} {'совпадает':>10}")
+
+for size in SIZES:
+    token_lists = make_token_lists(size)
+
+    start_time = time.perf_counter()
+    groups = smart_grouping(token_lists)
+    indexed_seconds = time.perf_counter() - start_time
+
+    reference_seconds = "-"
+    same = "-"
+    if size <= REFERENCE_LIMIT:
+        start_time = time.perf_counter()
+        expected = reference_grouping(token_lists)
+        reference_seconds = round(time.perf_counter() - start_time, 3)
+        same = "да" if groups == expected else "НЕТ"
+
+    print(f"{size:>8} {len(groups):>9} {round(indexed_seconds, 3):>10} {reference_seconds:>11} {same:>10}")
@@ -0,0 +1,185 @@
+import csv
+import random
+import re
+import sys
+import zlib
+import numpy as np
+
+ABBREVIATIONS = [
+    'ГТС', 'КС', 'ЛПУМГ', 'ГРС', 'АВО', 'САУ', 'ЭХЗ', 'ГПА', 'ДКС', 'УКПГ', 'НПС', 'АСУТП',
+    'ЦДП', 'ОЗП', 'ПТО', 'СИЗ', 'ВОЛС', 'ТЭЦ', 'КИПиА', 'ЛЧ МГ', 'ПЭБ', 'СТО', 'ГОСТ', 'НТД'
+]
+CODES = [
+    'ГПА-Ц-16', 'ГТК-10-4', 'СТО 2-2.3-141', 'ГОСТ Р 55999', 'ДУ-1000', 'PN-100', 'Ду-700', 'АВО-2',
+    'НЦ-16', 'ГПА-12Р', 'СКЗ-3', 'ПГ-10', 'БПТГ-2', 'ТЭН-3', 'ВЛ-10', 'DN-500', 'ЦБН-16', 'КЦ-4'
+]
+ORGANIZATIONS = [
+    'ПАО "Газпром"', 'ООО "Газпром трансгаз Ухта"', 'ООО "Газпром трансгаз Москва"', 'ООО "Газпром добыча Надым"',
+    'АО "Гипрогазцентр"', 'ООО "Газпром ВНИИГАЗ"', 'ПАО "Транснефть"', 'АО "Газпром газораспределение"',
+    'ООО "Газпромнефть-Хантос"', 'ПАО "Россети"', 'ООО "Газпром энерго"', 'АО "Газпром оргэнергогаз"',
+    'ООО "Газпром трансгаз Югорск"', 'ООО "Газпром ПХГ"', 'ПАО "Сибур Холдинг"', 'АО "ОДК"'
+]
+PLACES = [
+    'КС "Сосногорская"', 'КС "Ухтинская"', 'КС "Микунь"', 'ГРС "Печора"', 'ДКС "Бованенково"',
+    'КС "Вуктыльская"', 'УКПГ-2', 'КС "Приводино"', 'НПС "Палкино"', 'КС "Грязовец"', 'КС "Торжок"'
+]
+ACTIONS = [
+    'Модернизация', 'Автоматизация контроля', 'Снижение энергопотребления', 'Сокращение простоев',
+    'Повышение надёжности', 'Цифровой мониторинг', 'Ремонт без остановки', 'Замена уплотнений',
+    'Оптимизация графика обслуживания', 'Предиктивная диагностика', 'Дистанционный контроль',
+    'Снижение утечек', 'Продление ресурса', 'Обучение персонала обслуживанию'
+]
+OBJECTS = [
+    'газоперекачивающего агрегата', 'аппарата воздушного охлаждения', 'запорной арматуры', 'узла учёта газа',
+    'системы электрохимической защиты', 'компрессорного цеха', 'линейной части газопровода',
+    'станции катодной защиты', 'блока подготовки топливного газа', 'системы пожаротушения',
+    'маслосистемы нагнетателя', 'резервуарного парка', 'трубопроводной обвязки', 'котельной',
+    'склада горюче-смазочных материалов', 'диспетчерского пункта', 'вентиляции цеха', 'насосной станции',
+    'фильтра-сепаратора', 'пылеуловителя', 'подогревателя газа', 'узла редуцирования'
+]
+METHODS = [
+    'с применением беспроводных датчиков вибрации', 'с использованием тепловизионного контроля',
+    'за счёт частотного регулирования приводов', 'на основе моделей машинного обучения',
+    'с помощью беспилотных летательных аппаратов', 'путём замены на полимерные композитные материалы',
+    'с внедрением мобильного приложения для обходчиков', 'с переходом на светодиодное освещение',
+    'за счёт рекуперации тепла выхлопных газов', 'с установкой ультразвуковых расходомеров',
+    'с использованием цифрового двойника объекта', 'за счёт переналадки алгоритмов регулирования',
+    'путём нанесения антикоррозионного покрытия', 'с применением лазерного сканирования'
+]
+CONTEXTS = [
+    'Сейчас контроль выполняется вручную во время плановых обходов',
+    'Существующее оборудование эксплуатируется сверх нормативного срока',
+    'На объекте регулярно фиксируются отказы в зимний период',
+    'Данные о состоянии оборудования поступают с большой задержкой',
+    'Затраты на внеплановые ремонты растут несколько лет подряд',
+    'Действующая схема требует постоянного присутствия персонала',
+    'Замечания надзорных органов касались именно этого участка',
+    'Аналогичное решение уже опробовано на соседнем предприятии'
+]
+DETAILS = [
+    'подшипник', 'уплотнение', 'клапан', 'задвижка', 'кран', 'датчик давления', 'термопара', 'манометр',
+    'контроллер', 'шкаф управления', 'кабельная трасса', 'опора', 'фланец', 'прокладка', 'теплообменник',
+    'вентилятор', 'электродвигатель', 'редуктор', 'муфта', 'ротор', 'лопатка турбины', 'камера сгорания',
+    'фильтрующий элемент', 'маслоохладитель', 'насос', 'компрессор', 'ресивер', 'дренаж', 'байпас',
+    'анодное заземление', 'изолирующее соединение', 'расходомер', 'газоанализатор', 'извещатель',
+    'сервер', 'коммутатор', 'радиомодем', 'аккумуляторная батарея', 'инвертор', 'трансформатор',
+    'молниезащита', 'ограждение', 'кровля', 'утеплитель', 'лестница', 'площадка обслуживания', 'тельфер'
+]
+EFFECTS = [
+    'Ожидаемая экономия составит {amount} руб. в год',
+    'Время ремонта сокращается на {percent}%',
+    'Выбросы метана снижаются на {tons} т в год',
+    'Срок окупаемости около {years} лет',
+    'Внедрение запланировано до {date}'
+]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _effect(template: str, rnd: random.Random) -> str:
+    return template.format(
+        amount=f"{rnd.randint(1, 900) * 10_000:,}".replace(',', ' '),
+        percent=rnd.randint(5, 60),
+        tons=rnd.randint(1, 500),
+        years=rnd.randint(1, 7),
+        date=f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.{rnd.randint(2025, 2028)}"
+    )
+
+
+def make_topics(n_topics: int, seed: int = 0) -> list[dict]:
+    """
+    Темы идей: действие, объект, способ, место и организация фиксируются для темы,
+    идеи одной темы похожи по тексту и образуют кластеры
+    """
+    rnd = random.Random(seed)
+    topics = []
+    for _ in range(n_topics):
+        topics.append({
+            "action": rnd.choice(ACTIONS),
+            "object": rnd.choice(OBJECTS),
+            "context": rnd.choice(CONTEXTS),
+            "method": rnd.choice(METHODS),
+            "place": rnd.choice(PLACES),
+            "organization": rnd.choice(ORGANIZATIONS),
+            "abbreviations": rnd.sample(ABBREVIATIONS, 2),
+            "code": rnd.choice(CODES),
+            "details": rnd.sample(DETAILS, 8),
+            "effect": rnd.choice(EFFECTS),
+            "project": rnd.randint(1000, 99999)
+        })
+    return topics
+
+
+def make_ideas(n: int, seed: int = 0, ideas_per_topic: int = 25) -> list[tuple[str, str, str]]:
+    """
+    Синтетические идеи (номер, название, описание) с воспроизводимым seed:
+    темы выбираются по закону Ципфа, часть идей — единичные, без пары
+    """
+    rnd = random.Random(seed)
+    topics = make_topics(max(1, n // ideas_per_topic), seed)
+    weights = [1 / (rank + 1) ** 0.5 for rank in range(len(topics))]
+
+    ideas = []
+    for i in range(n):
+        topic = rnd.choices(topics, weights=weights)[0]
+        if rnd.random() < 0.1:
+            # единичная идея: тема собирается заново и почти ни с чем не совпадает
+            topic = make_topics(1, rnd.random())[0]
+        abbreviation = rnd.choice(topic["abbreviations"])
+        title = f"{topic['action']} {topic['object']} на {topic['place']}"
+        description = (
+            f"{topic['context']}. Работы выполняются {topic['method']} ({abbreviation}, {topic['code']}). "
+            f"Затрагиваются: {', '.join(rnd.sample(topic['details'], 7))} (проект {topic['project']}). "
+            f"Исполнитель — {topic['organization']}. {_effect(topic['effect'], rnd)}."
+        )
+        if rnd.random() < 0.15:
+            description += f" Согласовано с {rnd.choice(ORGANIZATIONS)} и службой {rnd.choice(ABBREVIATIONS)}."
+        ideas.append((str(100000 + i), title, description))
+    return ideas
+
+
+def write_csv(path: str, ideas: list[tuple[str, str, str]]) -> None:
+    """
+    Запись идей в формате data.csv: Номер идеи;Название;Описание
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(['Номер идеи', 'Название', 'Описание'])
+        writer.writerows(ideas)
+
+
+class StubEncoder:
+    """
+    Детерминированная замена SentenceTransformer без сети и весов модели:
+    эмбеддинг — нормированная сумма псевдослучайных векторов слов текста,
+    поэтому тексты с общими словами близки по косинусу
+    """
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self._vectors = {}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode('utf-8')))
+            vector = rng.standard_normal(self.dim).astype(np.float32)
+            self._vectors[word] = vector
+        return vector
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, convert_to_numpy: bool = True):
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in _TOKEN_RE.findall(text.lower()):
+                embeddings[i] += self._word_vector(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    path = sys.argv[2] if len(sys.argv) > 2 else f'synthetic_{size}.csv'
+    write_csv(path, make_ideas(size))
+    print(f"✅ {size} идей записано в {path}")
@@ -1 +1,2 @@
-from .db_class import Company_DB
\ No newline at end of file
+from .db_class import Company_DB
+from .recluster import ReclusterWorker
\ No newline at end of file
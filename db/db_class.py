@@ -1,56 +1,326 @@
 import psycopg2
 import csv
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from tqdm import tqdm
 from utils.transform import *
 from utils.embedding import *
+from utils.index import EmbeddingIndex, ClusterCentroids, compute_centroid
+from utils.metrics import span
 from db_config import config
 
-conn = psycopg2.connect(**config.DB_SETTINGS)
-import psycopg2
+def _pg_text_array(values) -> str:
+    """
+    Литерал массива TEXT[] для COPY
+    """
+    items = ('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return '{' + ','.join(items) + '}'
+
+def _pg_float_array(values) -> str:
+    """
+    Литерал массива FLOAT8[] для COPY
+    """
+    return '{' + ','.join(map(repr, values)) + '}'
+
+EMBEDDING_STORAGES = {
+    'float8': 'FLOAT8[]',
+    'float32': 'BYTEA',
+    'vector': 'vector({dim})'
+}
+SEARCH_BACKENDS = ('memory', 'pgvector')
+
+# data_type колонки в information_schema для каждого формата
+_STORAGE_DATA_TYPES = {
+    'float8': 'ARRAY',
+    'float32': 'bytea',
+    'vector': 'USER-DEFINED'
+}
+
+def _pg_vector(vector) -> str:
+    """
+    Литерал pgvector: [x1,x2,...]
+    """
+    return '[' + ','.join(map(repr, np.asarray(vector, dtype=np.float32).tolist())) + ']'
+
+def _encode_embedding(vector, storage: str):
+    """
+    Эмбеддинг в значение параметра запроса: FLOAT8[] — список, float32 — упакованные байты,
+    vector — литерал pgvector
+    """
+    if vector is None:
+        return None
+    if storage == 'float32':
+        return psycopg2.Binary(np.asarray(vector, dtype=np.float32).tobytes())
+    if storage == 'vector':
+        return _pg_vector(vector)
+    return np.asarray(vector, dtype=np.float64).tolist()
+
+def _decode_embedding(value):
+    """
+    Значение колонки эмбеддинга в np.ndarray; bytea читается без копирования через np.frombuffer
+    """
+    if value is None:
+        return None
+    if isinstance(value, (memoryview, bytes)):
+        return np.frombuffer(value, dtype=np.float32)
+    if isinstance(value, str):
+        return np.array(value[1:-1].split(','), dtype=np.float32)
+    return np.asarray(value)
+
+def _copy_embedding(vector, storage: str) -> str:
+    """
+    Эмбеддинг в текстовое значение для COPY
+    """
+    if storage == 'float32':
+        return '\\x' + np.asarray(vector, dtype=np.float32).tobytes().hex()
+    if storage == 'vector':
+        return _pg_vector(vector)
+    return _pg_float_array(vector.tolist())
+
+# ключ pg_advisory_lock для записи в clusters и cluster_members
+CLUSTERS_LOCK_ID = 7_341_009
+
+def _file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
 
 class Company_DB:
-    def __init__(self, dbname, user, password, host, port):
-        self.conn = psycopg2.connect(
+    def __init__(self, dbname, user, password, host, port, minconn=1, maxconn=10,
+                 embedding_storage=None, search_backend=None):
+        """
+        Инициализация пула соединений с PostgreSQL:
+        каждый вызов берёт своё соединение и свой курсор, поэтому
+        объект можно использовать из нескольких потоков одновременно.
+        embedding_storage — формат колонок эмбеддингов ('float8', 'float32' или 'vector'),
+        search_backend — где искать похожие идеи ('memory' — резидентный индекс, 'pgvector' — в PostgreSQL),
+        по умолчанию оба из конфига. Если таблица ideas уже есть, используется фактический формат её колонки.
+        """
+        self.embedding_storage = embedding_storage or config.STORAGE_SETTINGS['embedding_storage']
+        self.embedding_dim = config.STORAGE_SETTINGS['embedding_dim']
+        self.search_backend = search_backend or config.SEARCH_SETTINGS['backend']
+        if self.embedding_storage not in EMBEDDING_STORAGES:
+            raise ValueError(f"Неизвестный формат эмбеддингов: {self.embedding_storage}, "
+                             f"допустимые: {tuple(EMBEDDING_STORAGES)}")
+        if self.search_backend not in SEARCH_BACKENDS:
+            raise ValueError(f"Неизвестный backend поиска: {self.search_backend}, допустимые: {SEARCH_BACKENDS}")
+        if self.search_backend == 'pgvector' and self.embedding_storage != 'vector':
+            raise ValueError("Для SEARCH_BACKEND=pgvector нужен EMBEDDING_STORAGE=vector")
+        self.index = None
+        self.centroids = None
+        self.pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
             dbname=dbname,
             user=user,
             password=password,
             host=host,
             port=port
         )
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+        self._requested_storage = self.embedding_storage
+        self.embedding_storage = self._detect_embedding_storage()
+        if self.search_backend == 'pgvector' and self.embedding_storage != 'vector':
+            self.pool.closeall()
+            raise ValueError(f"Для SEARCH_BACKEND=pgvector нужен формат vector, а эмбеддинги в базе хранятся "
+                             f"в формате {self.embedding_storage}: EMBEDDING_STORAGE=vector python migrate_embeddings.py")
+
+    @contextmanager
+    def _connection(self):
         """
-        Инициализация соединения с PostgreSQL
+        Соединение из пула на время блока (autocommit); если пул исчерпан — ожидание
         """
-        self.conn.autocommit = True
-        self.cursor = self.conn.cursor()
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                conn.autocommit = True
+                yield conn
+            finally:
+                if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self.pool.putconn(conn, close=bool(conn.closed))
+
+    @contextmanager
+    def _cursor(self):
+        """
+        Курсор на отдельном соединении из пула
+        """
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def _detect_embedding_storage(self) -> str:
+        """
+        Формат колонки ideas.idea_embedding по information_schema;
+        если таблицы ещё нет — запрошенный формат
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT data_type FROM information_schema.columns WHERE table_name = 'ideas' AND column_name = 'idea_embedding'"
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return self._requested_storage
+
+        storage = next((name for name, data_type in _STORAGE_DATA_TYPES.items() if data_type == row[0]), None)
+        if storage is None:
+            self.pool.closeall()
+            raise ValueError(f"Неподдерживаемый тип колонки ideas.idea_embedding: {row[0]}, "
+                             f"допустимые форматы: {tuple(EMBEDDING_STORAGES)}")
+        if storage != self._requested_storage:
+            print(f"Эмбеддинги в базе хранятся в формате {storage}, а не {self._requested_storage}: "
+                  f"используется {storage}, перевод — python migrate_embeddings.py {self._requested_storage}")
+        return storage
+
+    def _column_type(self, storage=None) -> str:
+        """
+        SQL-тип колонок эмбеддингов для формата storage (по умолчанию текущего)
+        """
+        return EMBEDDING_STORAGES[storage or self.embedding_storage].format(dim=self.embedding_dim)
+
+    def _ensure_extension(self, cursor, storage=None):
+        if (storage or self.embedding_storage) == 'vector':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS vector;')
 
     def init_db_ideas(self):
         """
         Создание таблицы ideas
         """
-        self.cursor.execute('DROP TABLE IF EXISTS ideas;')
-        
-        self.cursor.execute('''
-            CREATE TABLE ideas (
-                id SERIAL PRIMARY KEY,
-                idea_id TEXT UNIQUE,
-                idea_title TEXT,
-                idea_description TEXT,
-                idea_key_words TEXT[],
-                idea_embedding FLOAT8[]
+        # новая таблица создаётся в запрошенном формате, а не в формате прежней
+        self.embedding_storage = self._requested_storage
+        with self._cursor() as cursor:
+            self._ensure_extension(cursor)
+            cursor.execute('DROP TABLE IF EXISTS ideas;')
+
+            cursor.execute(f'''
+                CREATE TABLE ideas (
+                    id SERIAL PRIMARY KEY,
+                    idea_id TEXT UNIQUE,
+                    idea_title TEXT,
+                    idea_description TEXT,
+                    idea_key_words TEXT[],
+                    idea_embedding {self._column_type()}
+                );
+            ''')
+        self.init_db_checkpoints()
+
+    def init_db_checkpoints(self):
+        """
+        Создание таблицы import_checkpoints: прогресс загрузки CSV для продолжения после сбоя
+        """
+        with self._cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS import_checkpoints;')
+
+            cursor.execute('''
+                CREATE TABLE import_checkpoints (
+                    source TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    rows_done INTEGER NOT NULL DEFAULT 0,
+                    completed BOOLEAN NOT NULL DEFAULT FALSE,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+            ''')
+
+    def init_db_clusters(self):
+        """
+        Создание таблиц clusters, cluster_members и cluster_builds
+        """
+        with self._cursor() as cursor:
+            self._ensure_extension(cursor)
+            cursor.execute('DROP TABLE IF EXISTS cluster_members;')
+            cursor.execute('DROP TABLE IF EXISTS clusters;')
+
+            cursor.execute(f'''
+                CREATE TABLE clusters (
+                    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    cluster_id TEXT UNIQUE,
+                    group_id INTEGER,
+                    clusters TEXT[],
+                    centroid {self._column_type()}
+                );
+            ''')
+            cursor.execute('CREATE INDEX clusters_group_id_idx ON clusters (group_id);')
+            self._create_cluster_members(cursor, 'cluster_members')
+            self._link_cluster_members(cursor)
+            cursor.execute('DROP TABLE IF EXISTS cluster_builds;')
+            self._create_cluster_builds(cursor)
+
+    def _create_cluster_members(self, cursor, table: str):
+        """
+        Таблица состава подгрупп (cluster_id, idea_id) с индексом по idea_id:
+        поиск подгрупп идеи — индексный поиск вместо просмотра массивов clusters
+        """
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                cluster_id TEXT NOT NULL,
+                idea_id TEXT NOT NULL,
+                PRIMARY KEY (cluster_id, idea_id)
             );
         ''')
+        cursor.execute(f'CREATE INDEX {table}_idea_id_idx ON {table} (idea_id);')
 
-    def init_db_clusters(self):
+    def _link_cluster_members(self, cursor):
         """
-        Создание таблицы clusters
+        Внешний ключ cluster_members → clusters: удаление подгруппы удаляет и её состав
         """
-        self.cursor.execute('DROP TABLE IF EXISTS clusters;')
+        cursor.execute('''
+            ALTER TABLE cluster_members ADD CONSTRAINT cluster_members_cluster_id_fkey
+            FOREIGN KEY (cluster_id) REFERENCES clusters (cluster_id) ON DELETE CASCADE;
+        ''')
 
-        self.cursor.execute('''
-            CREATE TABLE clusters (
-                id SERIAL PRIMARY KEY,
-                cluster_id TEXT UNIQUE,
-                clusters TEXT[]
+    def ensure_cluster_members(self):
+        """
+        Для баз, созданных до появления cluster_members: добавление колонок group_id
+        (номер группы из cluster_{группа}_{подгруппа}) и centroid (заполняется при перестройке),
+        создание таблицы по массивам clusters и индекса по group_id. Повторный вызов ничего не меняет.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("SELECT to_regclass('clusters'), to_regclass('cluster_members')")
+            clusters_table, members_table = cursor.fetchone()
+            if clusters_table is None:
+                return
+            cursor.execute('''
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name = 'clusters' AND column_name IN ('group_id', 'centroid')
+            ''')
+            columns = {row[0] for row in cursor.fetchall()}
+            if 'group_id' not in columns:
+                cursor.execute('ALTER TABLE clusters ADD COLUMN group_id INTEGER;')
+                cursor.execute("UPDATE clusters SET group_id = CAST(split_part(cluster_id, '_', 2) AS INTEGER)")
+                print("В таблицу clusters добавлена колонка group_id")
+            if 'centroid' not in columns:
+                self._ensure_extension(cursor)
+                cursor.execute(f'ALTER TABLE clusters ADD COLUMN centroid {self._column_type()};')
+                print("В таблицу clusters добавлена колонка centroid, центроиды появятся после process_clusters()")
+            cursor.execute('CREATE INDEX IF NOT EXISTS clusters_group_id_idx ON clusters (group_id);')
+            if members_table is not None:
+                return
+            self._create_cluster_members(cursor, 'cluster_members')
+            cursor.execute('''
+                INSERT INTO cluster_members (cluster_id, idea_id)
+                SELECT DISTINCT cluster_id, unnest(clusters) FROM clusters
+            ''')
+            self._link_cluster_members(cursor)
+            print("Таблица cluster_members заполнена по таблице clusters")
+
+    def _create_cluster_builds(self, cursor):
+        """
+        Таблица cluster_builds: версия, время и длительность каждой полной перестройки кластеров
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cluster_builds (
+                version INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                built_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                duration_seconds FLOAT8,
+                groups_count INTEGER,
+                subgroups_count INTEGER
             );
         ''')
 
@@ -58,62 +328,206 @@ class Company_DB:
         """
         Вставка записи в таблицу ideas
         """
-        self.cursor.execute('''
+        with self._cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO ideas (idea_id, idea_title, idea_description, idea_key_words, idea_embedding)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (idea_id) DO UPDATE SET
+                    idea_title = EXCLUDED.idea_title,
+                    idea_description = EXCLUDED.idea_description,
+                    idea_key_words = EXCLUDED.idea_key_words,
+                    idea_embedding = EXCLUDED.idea_embedding;
+            ''', (idea_id, idea_title, idea_description, idea_key_words,
+                  _encode_embedding(embedding, self.embedding_storage)))
+
+    def insert_many(self, rows: list[tuple], page_size=500):
+        """
+        Пакетная вставка записей (idea_id, idea_title, idea_description, idea_key_words, embedding)
+        в таблицу ideas через execute_values одной транзакцией
+        """
+        rows = [
+            (*row[:4], _encode_embedding(row[4], self.embedding_storage))
+            for row in rows
+        ]
+        with self._transaction() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO ideas (idea_id, idea_title, idea_description, idea_key_words, idea_embedding)
+                VALUES %s
+                ON CONFLICT (idea_id) DO UPDATE SET
+                    idea_title = EXCLUDED.idea_title,
+                    idea_description = EXCLUDED.idea_description,
+                    idea_key_words = EXCLUDED.idea_key_words,
+                    idea_embedding = EXCLUDED.idea_embedding;
+            ''', rows, page_size=page_size)
+
+    @contextmanager
+    def _transaction(self, conn=None):
+        """
+        Выполнение нескольких запросов в одной транзакции:
+        на переданном соединении conn или на новом соединении из пула
+        """
+        if conn is None:
+            with self._connection() as conn:
+                with self._transaction(conn) as cursor:
+                    yield cursor
+            return
+
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+    def load_data_from_csv(self, csv_file, chunk_size=1000):
+        """
+        Потоковая загрузка данных из CSV:
+        - Колонки: Номер идеи;Название;Описание
+        - CSV читается порциями по chunk_size строк, память не растёт с размером файла
+        - Ключевые слова → очистка → эмбеддинг для каждой порции
+        - Порция пишется через COPY во временную таблицу ideas_staging и сливается в ideas
+        - Вместе с порцией в import_checkpoints фиксируется число загруженных строк,
+          повторный запуск для того же файла продолжает с места остановки
+        """
+        source = os.path.abspath(csv_file)
+        fingerprint = _file_fingerprint(csv_file)
+
+        with self._connection() as conn, conn.cursor() as cursor:
+            rows_done = self._get_checkpoint(cursor, source, fingerprint)
+            if rows_done:
+                print(f"Продолжение загрузки {csv_file} со строки {rows_done}")
+
+            cursor.execute(f'''
+                CREATE TEMP TABLE IF NOT EXISTS ideas_staging (
+                    seq INTEGER,
+                    idea_id TEXT,
+                    idea_title TEXT,
+                    idea_description TEXT,
+                    idea_key_words TEXT[],
+                    idea_embedding {self._column_type()}
+                );
+            ''')
+
+            with open(csv_file, mode='r', encoding='utf-8-sig') as file:
+                reader = csv.DictReader(file, delimiter=';')
+                rows = islice(reader, rows_done, None)
+                with tqdm(desc="Загрузка CSV в БД", initial=rows_done, unit=" строк") as progress:
+                    while True:
+                        chunk = list(islice(rows, chunk_size))
+                        if not chunk:
+                            break
+                        self._load_csv_chunk(cursor, chunk, rows_done)
+                        rows_done += len(chunk)
+                        with self._transaction(conn) as transaction:
+                            self._merge_staging(transaction)
+                            self._save_checkpoint(transaction, source, fingerprint, rows_done, completed=False)
+                        progress.update(len(chunk))
+
+            self._save_checkpoint(cursor, source, fingerprint, rows_done, completed=True)
+
+    def _load_csv_chunk(self, cursor, chunk: list[dict], offset: int):
+        """
+        Ключевые слова → очистка → эмбеддинг для порции CSV и COPY в ideas_staging
+        """
+        ideas = []
+        for row in chunk:
+            idea_id = row['Номер идеи'].strip()
+            idea_title = row['Название'].strip()
+            idea_description = row['Описание'].strip()
+            ideas.append((idea_id, idea_title, idea_description, f"{idea_title} {idea_description}"))
+
+        texts = [idea[3] for idea in ideas]
+        raw_key_words_nested = get_key_words(texts)
+        filtered_key_words = filter_organizations_spacy_batch(raw_key_words_nested)
+        cleaned_texts = get_clean_text(texts, filtered_key_words)
+        embeddings = compute_embeddings(cleaned_texts)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for i, (idea_id, idea_title, idea_description, _) in enumerate(ideas):
+            writer.writerow([
+                offset + i,
+                idea_id,
+                idea_title,
+                idea_description,
+                _pg_text_array(filtered_key_words[i]),
+                _copy_embedding(embeddings[i], self.embedding_storage)
+            ])
+        buffer.seek(0)
+
+        cursor.execute("TRUNCATE ideas_staging;")
+        cursor.copy_expert('''
+            COPY ideas_staging (seq, idea_id, idea_title, idea_description, idea_key_words, idea_embedding)
+            FROM STDIN WITH (FORMAT csv)
+        ''', buffer)
+
+    def _merge_staging(self, cursor):
+        """
+        Слияние ideas_staging в ideas: при повторе idea_id побеждает последняя строка
+        """
+        cursor.execute('''
             INSERT INTO ideas (idea_id, idea_title, idea_description, idea_key_words, idea_embedding)
-            VALUES (%s, %s, %s, %s, %s)
+            SELECT DISTINCT ON (idea_id) idea_id, idea_title, idea_description, idea_key_words, idea_embedding
+            FROM ideas_staging
+            ORDER BY idea_id, seq DESC
             ON CONFLICT (idea_id) DO UPDATE SET
                 idea_title = EXCLUDED.idea_title,
                 idea_description = EXCLUDED.idea_description,
                 idea_key_words = EXCLUDED.idea_key_words,
                 idea_embedding = EXCLUDED.idea_embedding;
-        ''', (idea_id, idea_title, idea_description, idea_key_words, embedding))
+        ''')
+        cursor.execute("TRUNCATE ideas_staging;")
 
-    def load_data_from_csv(self, csv_file):
+    def _get_checkpoint(self, cursor, source: str, fingerprint: str) -> int:
         """
-        Загрузка данных из CSV:
-        - Чтение всех строк и векторизация батчем
-        - Колонки: Номер идеи;Название;Описание
-        - Ключевые слова → очистка → эмбеддинг → БД
+        Число уже загруженных строк незавершённого импорта этого же файла, иначе 0
         """
-        ideas = []
-        with open(csv_file, mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file, delimiter=';')
-            for row in tqdm(reader, desc="Чтение CSV"):
-                idea_id = row['Номер идеи'].strip()
-                idea_title = row['Название'].strip()
-                idea_description = row['Описание'].strip()
-                combined_text = f"{idea_title} {idea_description}"
-
-                ideas.append({
-                    "id": idea_id,
-                    "title": idea_title,
-                    "description": idea_description,
-                    "combined_text": combined_text
-                })
-
-        texts = [item["combined_text"] for item in ideas]
-        raw_key_words_nested = get_key_words(texts)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                source TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                completed BOOLEAN NOT NULL DEFAULT FALSE,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        ''')
+        cursor.execute(
+            "SELECT rows_done FROM import_checkpoints WHERE source = %s AND fingerprint = %s AND NOT completed",
+            (source, fingerprint)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
 
-        filtered_key_words = []
-        for kws in tqdm(raw_key_words_nested, desc="Фильтрация ключевых слов spaCy"):
-            filtered = filter_organizations_spacy(kws)
-            filtered_key_words.append(filtered)
+    def _save_checkpoint(self, cursor, source: str, fingerprint: str, rows_done: int, completed: bool):
+        cursor.execute('''
+            INSERT INTO import_checkpoints (source, fingerprint, rows_done, completed, updated_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (source) DO UPDATE SET
+                fingerprint = EXCLUDED.fingerprint,
+                rows_done = EXCLUDED.rows_done,
+                completed = EXCLUDED.completed,
+                updated_at = EXCLUDED.updated_at;
+        ''', (source, fingerprint, rows_done, completed))
 
-        cleaned_texts = get_clean_text(texts, filtered_key_words)
-        embeddings = compute_embeddings(cleaned_texts)
+    def has_pending_import(self, csv_file) -> bool:
+        """
+        Есть ли прерванная загрузка этого же CSV, которую можно продолжить
+        """
+        with self._cursor() as cursor:
+            cursor.execute("SELECT to_regclass('import_checkpoints') IS NOT NULL")
+            if not cursor.fetchone()[0]:
+                return False
+            return self._get_checkpoint(cursor, os.path.abspath(csv_file), _file_fingerprint(csv_file)) > 0
 
-        for i, idea in enumerate(tqdm(ideas, desc="Загрузка в БД")):
-            self.insert_data(
-                idea_id=idea["id"],
-                idea_title=idea["title"],
-                idea_description=idea["description"],
-                idea_key_words=filtered_key_words[i],
-                embedding=embeddings[i].tolist())
-            
-    def add_new_ideas(self, list_of_ideas: list[tuple]):
+    def add_new_ideas(self, list_of_ideas: list[tuple], batch_size: int = 32):
         """
         Добавление новых идей (идея_id, название, описание) вручную:
-        - Ключевые слова → очистка → эмбеддинг → БД
+        - Ключевые слова → очистка → эмбеддинг батчами по batch_size → БД
+        - Все записи пишутся одной транзакцией
         """
         ideas = []
         for idea_id, idea_title, idea_description in list_of_ideas:
@@ -125,74 +539,585 @@ class Company_DB:
                 "combined_text": combined_text.strip()
             })
 
+        operation = 'add_new_ideas'
         texts = [item["combined_text"] for item in ideas]
-        raw_key_words_nested = get_key_words(texts)
+        with span(operation, 'key_words'):
+            raw_key_words_nested = get_key_words(texts)
 
-        filtered_key_words = []
-        for kws in tqdm(raw_key_words_nested, desc="Фильтрация ключевых слов spaCy"):
-            filtered = filter_organizations_spacy(kws)
-            filtered_key_words.append(filtered)
+        with span(operation, 'organizations'):
+            filtered_key_words = filter_organizations_spacy_batch(raw_key_words_nested)
 
-        cleaned_texts = get_clean_text(texts, filtered_key_words)
-        embeddings = compute_embeddings(cleaned_texts)
+        with span(operation, 'clean_text'):
+            cleaned_texts = get_clean_text(texts, filtered_key_words)
+        with span(operation, 'encode'):
+            embeddings = compute_embeddings(cleaned_texts, batch_size=batch_size)
+
+        rows = [
+            (idea["id"], idea["title"], idea["description"], filtered_key_words[i], embeddings[i])
+            for i, idea in enumerate(ideas)
+        ]
+        with span(operation, 'insert'):
+            self.insert_many(rows)
+
+        if self.index is not None:
+            with span(operation, 'index_update'):
+                self.index.upsert(
+                    [idea["id"] for idea in ideas],
+                    [f"{idea['title']} {idea['description']}" for idea in ideas],
+                    embeddings
+                )
+
+    def load_index(self, **index_settings) -> EmbeddingIndex:
+        """
+        Построение индекса эмбеддингов по таблице ideas
+        Параметры:
+            index_settings: параметры EmbeddingIndex (backend, hnsw_*), по умолчанию точный поиск
+        """
+        with self._cursor() as cursor:
+            cursor.execute('SELECT idea_id, idea_title, idea_description, idea_embedding FROM ideas')
+            rows = cursor.fetchall()
+
+        idea_ids = []
+        full_texts = []
+        embeddings = []
+
+        for idea_id, title, description, embedding in rows:
+            if embedding is None:
+                continue
+            idea_ids.append(idea_id)
+            full_texts.append(f"{title.strip()} {description.strip()}")
+            embeddings.append(_decode_embedding(embedding))
+
+        index = EmbeddingIndex(**index_settings)
+        index.build(idea_ids, full_texts, embeddings)
+        return index
+
+    def build_index(self):
+        """
+        Резидентный индекс для поиска похожих идей,
+        дальше поддерживается через add_new_ideas и delete_idea
+        """
+        if self.search_backend == 'pgvector':
+            print("Поиск похожих идей выполняется в PostgreSQL (pgvector), резидентный индекс не строится")
+            return
+        self.index = self.load_index(**config.INDEX_SETTINGS)
+        print(f"Индекс эмбеддингов построен ({self.index.backend}): {len(self.index)} идей")
 
-        for i, idea in enumerate(tqdm(ideas, desc="Добавление идей в БД")):
-            self.insert_data(
-                idea_id=idea["id"],
-                idea_title=idea["title"],
-                idea_description=idea["description"],
-                idea_key_words=filtered_key_words[i],
-                embedding=embeddings[i].tolist()
+    def existing_idea_ids(self, idea_ids: list[str]) -> set:
+        """
+        Какие из переданных ID уже есть в таблице ideas — один запрос на весь список
+        """
+        if not idea_ids:
+            return set()
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT idea_id FROM ideas WHERE idea_id = ANY(%s);",
+                (list(idea_ids),)
             )
+            return {row[0] for row in cursor.fetchall()}
 
     def get_all_ideas(self):
         """
         Получение всех строк из таблицы
         """
-        self.cursor.execute('SELECT * FROM users')
-        return self.cursor.fetchall()
+        with self._cursor() as cursor:
+            cursor.execute('SELECT * FROM users')
+            return cursor.fetchall()
     
-    def process_clusters(self, eps=0.25, min_samples=2, threshold=20):
+    def process_clusters(self, eps=0.25, min_samples=2, threshold=20, attempts=3):
+        """
+        Кластеризация идей по эмбеддингам + smart-группировка по ключевым словам.
+        Новые подгруппы пишутся в теневую таблицу, которая подменяет clusters в той же транзакции:
+        читатели видят либо прежний, либо новый набор целиком.
+        Расчёт идёт без блокировок; блокировка записи кластеров берётся только на подмену,
+        и если идеи за время расчёта изменились, перестройка повторяется (до attempts раз).
+        """
+        for attempt in range(1, attempts + 1):
+            if self._process_clusters(eps, min_samples, threshold):
+                return
+            print(f"Идеи изменились во время перестройки кластеров, повтор ({attempt}/{attempts})")
+        raise RuntimeError(f"Перестройка кластеров не завершена: идеи менялись во всех {attempts} попытках")
+
+    def _ideas_version(self, cursor) -> tuple:
         """
-        Кластеризация идей по эмбеддингам + smart-группировка по ключевым словам
+        Отпечаток содержимого ideas: число строк и сумма xmin, меняется при любой вставке, изменении или удалении
         """
-        self.cursor.execute('SELECT idea_id, idea_key_words, idea_embedding FROM ideas;')
-        rows = self.cursor.fetchall()
+        cursor.execute('SELECT count(*), COALESCE(sum(xmin::text::bigint), 0) FROM ideas')
+        return tuple(cursor.fetchone())
+
+    def _process_clusters(self, eps, min_samples, threshold) -> bool:
+        """
+        Одна попытка перестройки; False — идеи изменились после чтения и подмена не выполнена
+        """
+        operation = 'process_clusters'
+        start_time = time.perf_counter()
+        with span(operation, 'ideas_fetch'), self._cursor() as cursor:
+            # отпечаток до выборки: изменение между ними даст лишний повтор, но не устаревшие кластеры
+            version = self._ideas_version(cursor)
+            cursor.execute('SELECT idea_id, idea_key_words, idea_embedding FROM ideas;')
+            rows = cursor.fetchall()
 
         if not rows:
             print("Нет данных в таблице ideas.")
-            return
+            return True
 
         idea_ids = []
         key_words = []
         embeddings = []
 
-        for idea_id, kws, emb in rows:
-            idea_ids.append(idea_id)
-            key_words.append(kws if kws else ['АРГЕС'])
-            embeddings.append(emb)
+        with span(operation, 'decode'):
+            for idea_id, kws, emb in rows:
+                idea_ids.append(idea_id)
+                key_words.append(kws if kws else ['АРГЕС'])
+                embeddings.append(_decode_embedding(emb))
+            embeddings = np.array(embeddings)
 
-        embeddings = np.array(embeddings)
-        df_clusters = cluster_embeddings(idea_ids, embeddings, eps, min_samples)
-        duplicate_groups, _ = extract_duplicates_and_uniques(df_clusters)
+        positions = {idea_id: i for i, idea_id in enumerate(idea_ids)}
+        with span(operation, 'dbscan'):
+            df_clusters = cluster_embeddings(
+                idea_ids, embeddings, eps, min_samples,
+                memory_limit_mb=config.CLUSTER_SETTINGS['memory_limit_mb'],
+                workers=config.CLUSTER_SETTINGS['workers']
+            )
+            duplicate_groups, _ = extract_duplicates_and_uniques(df_clusters)
 
         total_subgroups = 0
-        self.cursor.execute("DELETE FROM clusters;")
+        cluster_ids = []
+        cluster_members = []
+        cluster_centroids = []
+        rows = []
+        member_rows = []
+
+        with span(operation, 'smart_grouping'):
+            for group_num, group in enumerate(duplicate_groups):
+                indices = [positions[idea_id] for idea_id in group]
+                token_lists = [key_words[i] for i in indices]
+                subgroups = smart_grouping(token_lists, threshold)
+
+                for subgroup in subgroups:
+                    subgroup_ids = [group[i] for i in subgroup]
+                    cluster_id = f'cluster_{group_num}_{total_subgroups}'
+                    centroid = compute_centroid(embeddings[[indices[i] for i in subgroup]])
+                    rows.append((cluster_id, group_num, subgroup_ids, _encode_embedding(centroid, self.embedding_storage)))
+                    member_rows.extend((cluster_id, idea_id) for idea_id in dict.fromkeys(subgroup_ids))
+                    cluster_ids.append(cluster_id)
+                    cluster_members.append(subgroup_ids)
+                    cluster_centroids.append(centroid)
+                    total_subgroups += 1
+
+        with span(operation, 'write'), self._transaction() as cursor:
+            self._lock_clusters(cursor)
+            if self._ideas_version(cursor) != version:
+                return False
+            cursor.execute('DROP TABLE IF EXISTS clusters_shadow;')
+            cursor.execute('CREATE TABLE clusters_shadow (LIKE clusters INCLUDING ALL EXCLUDING DEFAULTS);')
+            cursor.execute('''
+                SELECT is_identity FROM information_schema.columns
+                WHERE table_name = 'clusters_shadow' AND column_name = 'id'
+            ''')
+            if cursor.fetchone()[0] != 'YES':
+                # таблицы, созданные с id SERIAL, переводятся на IDENTITY при первой перестройке
+                cursor.execute('ALTER TABLE clusters_shadow ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;')
+
+            execute_values(cursor, '''
+                INSERT INTO clusters_shadow (cluster_id, group_id, clusters, centroid) VALUES %s
+            ''', rows, page_size=500)
+
+            cursor.execute('DROP TABLE IF EXISTS cluster_members_shadow;')
+            self._create_cluster_members(cursor, 'cluster_members_shadow')
+            execute_values(cursor, '''
+                INSERT INTO cluster_members_shadow (cluster_id, idea_id) VALUES %s
+            ''', member_rows, page_size=1000)
+
+            cursor.execute('DROP TABLE IF EXISTS cluster_members;')
+            self._swap_table(cursor, 'clusters')
+            self._swap_table(cursor, 'cluster_members')
+            cursor.execute('CREATE INDEX IF NOT EXISTS clusters_group_id_idx ON clusters (group_id);')
+            self._link_cluster_members(cursor)
+
+            self._create_cluster_builds(cursor)
+            cursor.execute('''
+                INSERT INTO cluster_builds (duration_seconds, groups_count, subgroups_count)
+                VALUES (%s, %s, %s)
+                RETURNING version
+            ''', (round(time.perf_counter() - start_time, 3), len(duplicate_groups), total_subgroups))
+            build_version = cursor.fetchone()[0]
+
+        if self.centroids is not None:
+            self.centroids.build(cluster_ids, cluster_members, cluster_centroids)
+
+        print(f"Обработано кластеров: {len(duplicate_groups)}, всего подгрупп: {total_subgroups}, версия {build_version}")
+        return True
+
+    def _lock_clusters(self, cursor):
+        """
+        Блокировка записи кластеров до конца текущей транзакции: инкрементальные обновления,
+        очистка при удалении и подмена таблиц полной перестройкой выполняются по очереди
+        """
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (CLUSTERS_LOCK_ID,))
+
+    def _swap_table(self, cursor, table: str):
+        """
+        Замена table на {table}_shadow внутри текущей транзакции;
+        индексы и последовательность получают прежние имена
+        """
+        shadow = f'{table}_shadow'
+        cursor.execute(f'DROP TABLE IF EXISTS {table};')
+        cursor.execute(f'ALTER TABLE {shadow} RENAME TO {table};')
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname LIKE %s",
+            (table, shadow.replace('_', '\\_') + '%')
+        )
+        for (index_name,) in cursor.fetchall():
+            new_name = table + index_name[len(shadow):]
+            cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{new_name}";')
+        if table == 'clusters':
+            cursor.execute("SELECT pg_get_serial_sequence('clusters', 'id')")
+            sequence = cursor.fetchone()[0]
+            if sequence is not None and sequence.split('.')[-1] != 'clusters_id_seq':
+                cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO clusters_id_seq;')
+
+    def cluster_build_info(self) -> dict | None:
+        """
+        Последняя полная перестройка кластеров: версия, время, длительность и размеры
+        """
+        with self._cursor() as cursor:
+            cursor.execute("SELECT to_regclass('cluster_builds')")
+            if cursor.fetchone()[0] is None:
+                return None
+            cursor.execute('''
+                SELECT version, built_at, duration_seconds, groups_count, subgroups_count
+                FROM cluster_builds ORDER BY version DESC LIMIT 1
+            ''')
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        version, built_at, duration_seconds, groups_count, subgroups_count = row
+        return {
+            "version": version,
+            "built_at": built_at.isoformat(),
+            "duration_seconds": duration_seconds,
+            "groups": groups_count,
+            "subgroups": subgroups_count
+        }
+
+    def update_clusters(self, idea_ids: list, eps=0.25, min_samples=2, threshold=20):
+        """
+        Инкрементальная кластеризация новых или изменённых идей:
+        - идея убирается из прежней группы
+        - по соседям в радиусе eps она присоединяется к группе, объединяет несколько групп
+          или создаёт новую группу вместе с соседями, не попавшими ни в одну группу
+        - smart-подгруппы пересчитываются только для затронутых групп
+        При search_backend == 'pgvector' соседи ищутся в PostgreSQL, а из базы читаются
+        только векторы затронутых идей — резидентный индекс не строится.
+        Полная перестройка по всему корпусу — process_clusters()
+        """
+        index = self.index
+        if index is None and self.search_backend != 'pgvector':
+            index = self.load_index()
+
+        for idea_id in idea_ids:
+            idea_id = str(idea_id)
+            with self._transaction() as cursor:
+                self._lock_clusters(cursor)
+                affected = {
+                    group_id: [m for m in members if m != idea_id]
+                    for group_id, members in self._groups_containing(cursor, [idea_id]).items()
+                }
+
+                vector = self._embeddings_by_id(cursor, [idea_id], index).get(idea_id)
+                if vector is not None:
+                    neighbours = [n for n in self._radius_neighbours(cursor, vector, eps, index) if n != idea_id]
+                    neighbour_groups = self._groups_containing(cursor, neighbours)
+                    for group_id, members in neighbour_groups.items():
+                        affected.setdefault(group_id, [m for m in members if m != idea_id])
 
-        for group_num, group in enumerate(duplicate_groups):
-            indices = [idea_ids.index(idea_id) for idea_id in group]
-            token_lists = [key_words[i] for i in indices]
-            subgroups = smart_grouping(token_lists, threshold)
+                    is_core = len(neighbours) + 1 >= min_samples
+                    if neighbour_groups and is_core:
+                        target = min(neighbour_groups)
+                        grouped = set().union(*neighbour_groups.values())
+                        members = []
+                        for group_id in sorted(neighbour_groups):
+                            members += affected[group_id]
+                            affected[group_id] = []
+                        members += [n for n in neighbours if n not in grouped]
+                        affected[target] = list(dict.fromkeys(members + [idea_id]))
+                    elif neighbour_groups:
+                        nearest = next(n for n in neighbours if any(n in m for m in neighbour_groups.values()))
+                        group_id = next(g for g, m in neighbour_groups.items() if nearest in m)
+                        affected[group_id].append(idea_id)
+                    elif is_core:
+                        affected[self._next_group_id(cursor)] = [idea_id] + neighbours
 
-            for subgroup in subgroups:
-                subgroup_ids = [group[i] for i in subgroup]
-                self.cursor.execute('''
-                    INSERT INTO clusters (cluster_id, clusters)
-                    VALUES (%s, %s)
-                ''', (f'cluster_{group_num}_{total_subgroups}', subgroup_ids))
-                total_subgroups += 1
+                centroid_updates = self._rewrite_groups(cursor, affected, index, threshold)
+            # резидентные центроиды меняются только после успешного commit
+            self._apply_centroid_updates(centroid_updates)
 
-        print(f"Обработано кластеров: {len(duplicate_groups)}, всего подгрупп: {total_subgroups}")
+        print(f"Инкрементальная кластеризация: обработано идей {len(idea_ids)}")
+
+    def _groups_containing(self, cursor, idea_ids: list) -> dict:
+        """
+        Группы DBSCAN, в которые входит хотя бы одна из идей: {group_id: [idea_id, ...]}
+        """
+        if not idea_ids:
+            return {}
+        cursor.execute('''
+            SELECT group_id, clusters FROM clusters
+            WHERE group_id IN (
+                SELECT c.group_id FROM cluster_members m JOIN clusters c USING (cluster_id)
+                WHERE m.idea_id = ANY(%s)
+            )
+            ORDER BY group_id, id
+        ''', (list(idea_ids),))
+
+        groups = {}
+        for group_id, members in cursor.fetchall():
+            groups.setdefault(group_id, []).extend(members)
+        return groups
+
+    def _radius_neighbours(self, cursor, vector, eps, index=None) -> list:
+        """
+        idea_id идей в радиусе eps (косинусное расстояние) по убыванию сходства:
+        по резидентному индексу или запросом в PostgreSQL (pgvector)
+        """
+        if index is not None:
+            return index.radius_search(vector, 1 - eps)
+        cursor.execute('''
+            SELECT idea_id FROM ideas
+            WHERE idea_embedding <=> %(query)s::vector <= %(eps)s
+            ORDER BY idea_embedding <=> %(query)s::vector
+        ''', {"query": _pg_vector(vector), "eps": eps})
+        return [row[0] for row in cursor.fetchall()]
+
+    def _embeddings_by_id(self, cursor, idea_ids: list, index=None) -> dict:
+        """
+        Эмбеддинги идей {idea_id: вектор}: из резидентного индекса или только запрошенные строки ideas;
+        идеи без эмбеддинга пропускаются
+        """
+        if index is not None:
+            idea_ids = [idea_id for idea_id in dict.fromkeys(idea_ids) if idea_id in index]
+            return dict(zip(idea_ids, index.get_vectors(idea_ids)))
+        cursor.execute(
+            "SELECT idea_id, idea_embedding FROM ideas WHERE idea_id = ANY(%s) AND idea_embedding IS NOT NULL",
+            (list(idea_ids),)
+        )
+        return {idea_id: _decode_embedding(embedding) for idea_id, embedding in cursor.fetchall()}
+
+    def _next_group_id(self, cursor) -> int:
+        cursor.execute("SELECT COALESCE(MAX(group_id) + 1, 0) FROM clusters")
+        return cursor.fetchone()[0]
+
+    def _rewrite_groups(self, cursor, groups: dict, index=None, threshold=20) -> list[tuple]:
+        """
+        Перезапись smart-подгрупп для затронутых групп DBSCAN.
+        Группа из одной идеи или пустая удаляется.
+        Векторы участников берутся из index, без него — из таблицы ideas.
+        Возвращает изменения центроидов [(cluster_id, участники, центроид или None)]
+        для _apply_centroid_updates после commit.
+        """
+        centroid_updates = []
+        vectors = self._embeddings_by_id(cursor, [m for members in groups.values() for m in members], index)
+        cursor.execute(
+            "SELECT COALESCE(MAX(CAST(split_part(cluster_id, '_', 3) AS INTEGER)) + 1, 0) FROM clusters"
+        )
+        next_subgroup = cursor.fetchone()[0]
+
+        for group_id, members in groups.items():
+            cursor.execute("DELETE FROM clusters WHERE group_id = %s RETURNING cluster_id", (group_id,))
+            centroid_updates.extend((cluster_id, [], None) for (cluster_id,) in cursor.fetchall())
+
+            if len(members) < 2:
+                continue
+
+            cursor.execute(
+                "SELECT idea_id, idea_key_words FROM ideas WHERE idea_id = ANY(%s)",
+                (members,)
+            )
+            key_words = dict(cursor.fetchall())
+            members = [m for m in members if m in key_words and m in vectors]
+            token_lists = [key_words[m] if key_words[m] else ['АРГЕС'] for m in members]
+
+            for subgroup in smart_grouping(token_lists, threshold):
+                subgroup_ids = [members[i] for i in subgroup]
+                cluster_id = f'cluster_{group_id}_{next_subgroup}'
+                centroid = compute_centroid(np.array([vectors[m] for m in subgroup_ids]))
+                cursor.execute('''
+                    INSERT INTO clusters (cluster_id, group_id, clusters, centroid)
+                    VALUES (%s, %s, %s, %s)
+                ''', (cluster_id, group_id, subgroup_ids, _encode_embedding(centroid, self.embedding_storage)))
+                execute_values(cursor, '''
+                    INSERT INTO cluster_members (cluster_id, idea_id) VALUES %s ON CONFLICT DO NOTHING
+                ''', [(cluster_id, idea_id) for idea_id in subgroup_ids])
+                centroid_updates.append((cluster_id, subgroup_ids, centroid))
+                next_subgroup += 1
+        return centroid_updates
+
+    def load_centroids(self) -> ClusterCentroids:
+        """
+        Загрузка центроидов подгрупп из таблицы clusters
+        """
+        with self._cursor() as cursor:
+            cursor.execute("SELECT cluster_id, clusters, centroid FROM clusters WHERE centroid IS NOT NULL")
+            rows = cursor.fetchall()
+
+        centroids = ClusterCentroids()
+        centroids.build(
+            [cluster_id for cluster_id, _, _ in rows],
+            [members for _, members, _ in rows],
+            [_decode_embedding(centroid) for _, _, centroid in rows]
+        )
+        return centroids
+
+    def build_centroids(self):
+        """
+        Резидентная матрица центроидов, дальше поддерживается
+        через process_clusters и _cleanup_clusters
+        """
+        if self.search_backend == 'pgvector':
+            return
+        self.centroids = self.load_centroids()
+
+    def migrate_embedding_storage(self, storage=None, batch_size=1000):
+        """
+        Перевод колонок ideas.idea_embedding и clusters.centroid в формат storage
+        ('float8' — FLOAT8[], 'float32' — BYTEA, 'vector' — pgvector) одной транзакцией на таблицу.
+        По умолчанию — формат из конфига; уже переведённые колонки пропускаются.
+        """
+        storage = storage or self.embedding_storage
+        if storage not in EMBEDDING_STORAGES:
+            raise ValueError(f"Неизвестный формат эмбеддингов: {storage}, допустимые: {tuple(EMBEDDING_STORAGES)}")
+        column_type = self._column_type(storage)
+
+        for table, key, column in (('ideas', 'idea_id', 'idea_embedding'), ('clusters', 'cluster_id', 'centroid')):
+            with self._transaction() as cursor:
+                self._ensure_extension(cursor, storage)
+                cursor.execute(
+                    "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+                    (table, column)
+                )
+                row = cursor.fetchone()
+                if row is None or row[0] == _STORAGE_DATA_TYPES[storage]:
+                    continue
+
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column}_new {column_type}")
+                with cursor.connection.cursor(name=f"migrate_{table}") as reader:
+                    reader.itersize = batch_size
+                    reader.execute(f"SELECT {key}, {column} FROM {table} WHERE {column} IS NOT NULL")
+                    while True:
+                        rows = reader.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        execute_values(cursor, f'''
+                            UPDATE {table} SET {column}_new = v.value::{column_type}
+                            FROM (VALUES %s) AS v(key, value)
+                            WHERE {table}.{key} = v.key
+                        ''', [
+                            (k, _encode_embedding(_decode_embedding(value), storage))
+                            for k, value in rows
+                        ], page_size=batch_size)
+                cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+                cursor.execute(f"ALTER TABLE {table} RENAME COLUMN {column}_new TO {column}")
+            print(f"Колонка {table}.{column} переведена в {column_type}")
+
+        self.embedding_storage = storage
+        if storage == 'vector':
+            self.create_vector_index()
+
+    def create_vector_index(self):
+        """
+        ANN-индекс pgvector по ideas.idea_embedding (косинусное расстояние):
+        HNSW или IVFFlat по PGVECTOR_INDEX. IVFFlat строится по имеющимся данным,
+        поэтому его создают после загрузки.
+        """
+        settings = config.SEARCH_SETTINGS
+        with self._cursor() as cursor:
+            if settings['pgvector_index'] == 'ivfflat':
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS ideas_embedding_ivfflat ON ideas
+                    USING ivfflat (idea_embedding vector_cosine_ops) WITH (lists = {int(settings['ivfflat_lists'])});
+                ''')
+            else:
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS ideas_embedding_hnsw ON ideas
+                    USING hnsw (idea_embedding vector_cosine_ops)
+                    WITH (m = {int(config.INDEX_SETTINGS['hnsw_m'])},
+                          ef_construction = {int(config.INDEX_SETTINGS['hnsw_ef_construction'])});
+                ''')
+
+    def _set_search_params(self, cursor, top_n: int):
+        if config.SEARCH_SETTINGS['pgvector_index'] == 'ivfflat':
+            cursor.execute(f"SET LOCAL ivfflat.probes = {int(config.SEARCH_SETTINGS['ivfflat_probes'])}")
+        else:
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {max(int(config.INDEX_SETTINGS['hnsw_ef_search']), int(top_n))}")
+
+    def search_similar(self, embedding, top_n: int = 15) -> list[tuple]:
+        """
+        Топ-N ближайших идей поиском в PostgreSQL (pgvector):
+        [(idea_id, полный_текст, сходство), ...], из базы читаются только найденные строки
+        """
+        query = _pg_vector(embedding)
+        with self._transaction() as cursor:
+            self._set_search_params(cursor, top_n)
+            cursor.execute('''
+                SELECT idea_id, idea_title, idea_description, 1 - (idea_embedding <=> %(query)s::vector)
+                FROM ideas
+                WHERE idea_embedding IS NOT NULL
+                ORDER BY idea_embedding <=> %(query)s::vector
+                LIMIT %(top_n)s
+            ''', {"query": query, "top_n": top_n})
+            rows = cursor.fetchall()
+
+        return [
+            (idea_id, f"{title.strip()} {description.strip()}", float(similarity))
+            for idea_id, title, description, similarity in rows
+        ]
+
+    def best_cluster(self, embedding) -> tuple | None:
+        """
+        Ближайшая к запросу подгруппа по центроиду в PostgreSQL (pgvector):
+        (cluster_id, idea_ids, сходство) или None
+        """
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT cluster_id, clusters, 1 - (centroid <=> %(query)s::vector)
+                FROM clusters
+                WHERE centroid IS NOT NULL
+                ORDER BY centroid <=> %(query)s::vector
+                LIMIT 1
+            ''', {"query": _pg_vector(embedding)})
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        cluster_id, members, similarity = row
+        return cluster_id, members, float(similarity)
+
+    def find_idea_clusters(self, idea_id: str) -> list[dict]:
+        """
+        Подгруппы, в которые входит идея: [{"cluster_id", "group_id", "idea_ids"}, ...]
+        """
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT c.cluster_id, c.group_id, c.clusters
+                FROM cluster_members m JOIN clusters c USING (cluster_id)
+                WHERE m.idea_id = %s
+                ORDER BY c.id
+            ''', (idea_id,))
+            return [
+                {"cluster_id": cluster_id, "group_id": group_id, "idea_ids": members}
+                for cluster_id, group_id, members in cursor.fetchall()
+            ]
+
+    def _get_embeddings(self, cursor, idea_ids: list) -> np.ndarray:
+        """
+        Эмбеддинги идей: из резидентного индекса, если он есть, иначе из таблицы ideas
+        """
+        if self.index is not None:
+            return self.index.get_vectors(idea_ids)
+        cursor.execute(
+            "SELECT idea_embedding FROM ideas WHERE idea_id = ANY(%s) AND idea_embedding IS NOT NULL",
+            (list(idea_ids),)
+        )
+        return np.array([_decode_embedding(row[0]) for row in cursor.fetchall()])
 
     def delete_idea(self, idea_id: str):
         """
@@ -203,45 +1128,80 @@ class Company_DB:
             bool: True если удаление прошло успешно, False если идея не найдена
         """
         try:
-            self.cursor.execute(
-                "DELETE FROM ideas WHERE idea_id = %s",
-                (idea_id,)
-            )
-            if self.cursor.rowcount > 0:
+            with self._transaction() as cursor:
+                # блокировка до DELETE: иначе проверка внешнего ключа в process_clusters
+                # ждёт удаляемую строку, а удаление — блокировку кластеров
+                self._lock_clusters(cursor)
+                cursor.execute(
+                    "DELETE FROM ideas WHERE idea_id = %s",
+                    (idea_id,)
+                )
+                deleted = cursor.rowcount > 0
+                centroid_updates = self._cleanup_clusters(cursor, idea_id) if deleted else []
+
+            if deleted:
                 print(f"Идея {idea_id} успешно удалена")
-                self._cleanup_clusters(idea_id)
+                # резидентные индекс и центроиды меняются только после успешного commit
+                if self.index is not None:
+                    self.index.remove(idea_id)
+                self._apply_centroid_updates(centroid_updates)
                 return True
             else:
                 print(f"Идея {idea_id} не найдена")
                 return False
-                
+
         except Exception as e:
             print(f"Ошибка при удалении идеи {idea_id}: {str(e)}")
             return False
 
-    def _cleanup_clusters(self, idea_id: str):
+    def _apply_centroid_updates(self, centroid_updates: list[tuple]) -> None:
         """
-        Приватный метод для очистки упоминаний идеи в кластерах
+        Перенос в резидентные центроиды изменений [(cluster_id, участники, центроид или None)]
+        после commit транзакции, в которой они записаны в clusters
         """
-        try:
-            self.cursor.execute(
-                "SELECT cluster_id, clusters FROM clusters WHERE %s = ANY(clusters)",
-                (idea_id,)
-            )
-            for cluster_id, clusters in self.cursor.fetchall():
-                updated_clusters = [id for id in clusters if id != idea_id]
-                if updated_clusters:
-                    self.cursor.execute(
-                        "UPDATE clusters SET clusters = %s WHERE cluster_id = %s",
-                        (updated_clusters, cluster_id)
-                    )
-                else:
-                    self.cursor.execute(
-                        "DELETE FROM clusters WHERE cluster_id = %s",
-                        (cluster_id,)
-                    )   
-        except Exception as e:
-            print(f"Ошибка при очистке кластеров: {str(e)}")
+        if self.centroids is None:
+            return
+        for cluster_id, members, centroid in centroid_updates:
+            if centroid is None:
+                self.centroids.remove(cluster_id)
+            else:
+                self.centroids.update(cluster_id, members, centroid)
+
+    def _cleanup_clusters(self, cursor, idea_id: str) -> list[tuple]:
+        """
+        Приватный метод для очистки упоминаний идеи в кластерах внутри транзакции удаления
+        (блокировка записи кластеров уже взята, _lock_clusters).
+        Ошибка не перехватывается: транзакция откатывается целиком.
+        Возвращает изменения центроидов [(cluster_id, участники, центроид или None)]
+        для резидентной матрицы — их применяют после commit.
+        """
+        centroid_updates = []
+        cursor.execute('''
+            SELECT c.cluster_id, c.clusters
+            FROM cluster_members m JOIN clusters c USING (cluster_id)
+            WHERE m.idea_id = %s
+        ''', (idea_id,))
+        for cluster_id, clusters in cursor.fetchall():
+            updated_clusters = [id for id in clusters if id != idea_id]
+            if updated_clusters:
+                cursor.execute(
+                    "DELETE FROM cluster_members WHERE cluster_id = %s AND idea_id = %s",
+                    (cluster_id, idea_id)
+                )
+                vectors = self._get_embeddings(cursor, updated_clusters)
+                centroid = compute_centroid(vectors) if len(vectors) else None
+                cursor.execute(
+                    "UPDATE clusters SET clusters = %s, centroid = %s WHERE cluster_id = %s",
+                    (updated_clusters, _encode_embedding(centroid, self.embedding_storage), cluster_id)
+                )
+                centroid_updates.append((cluster_id, updated_clusters, centroid))
+            else:
+                cursor.execute(
+                    "DELETE FROM clusters WHERE cluster_id = %s",
+                    (cluster_id,)
+                )
+                centroid_updates.append((cluster_id, [], None))
+        return centroid_updates
 
     def idea_exists(self, idea_id: str) -> bool:
         """
@@ -249,18 +1209,18 @@ class Company_DB:
         Возвращает True, если идея существует, иначе False.
         """
         try:
-            self.cursor.execute(
-                "SELECT 1 FROM ideas WHERE idea_id = %s LIMIT 1;",
-                (idea_id,)
-            )
-            return self.cursor.fetchone() is not None
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM ideas WHERE idea_id = %s LIMIT 1;",
+                    (idea_id,)
+                )
+                return cursor.fetchone() is not None
         except Exception as e:
             print(f"Ошибка при проверке наличия идеи: {str(e)}")
             return False
 
     def close(self):
         """
-        Закрытие соединения
+        Закрытие всех соединений пула
         """
-        self.cursor.close()
-        self.conn.close()
\ No newline at end of file
+        self.pool.closeall()
\ No newline at end of file
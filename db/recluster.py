@@ -0,0 +1,138 @@
+import threading
+import time
+import traceback
+
+
+class ReclusterWorker:
+    """
+    Фоновая перекластеризация:
+    - записи только ставят запрос в очередь, ответ не ждёт кластеризации
+    - запросы схлопываются: запуск после паузы debounce_seconds без новых запросов,
+      но не позже max_staleness_seconds от первого необработанного запроса
+    - mode='incremental' — update_clusters по накопленным idea_id, 'full' — process_clusters
+    - при ошибке запуска его idea_id (или полная перестройка) возвращаются в очередь
+    """
+    def __init__(self, db, mode='incremental', debounce_seconds=2.0, max_staleness_seconds=30.0):
+        self.db = db
+        self.mode = mode
+        self.debounce_seconds = debounce_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._pending_ids = {}
+        self._full_pending = False
+        self._first_request_at = None
+        self._last_request_at = None
+        self._running = False
+
+        self.version = 0
+        self.last_built_at = None
+        self.last_duration = None
+        self.last_error = None
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="recluster-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Остановка: накопленные запросы обрабатываются сразу, без ожидания паузы
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, idea_ids: list):
+        """
+        Запрос на перекластеризацию после добавления или изменения идей
+        """
+        with self._cond:
+            self._pending_ids.update(dict.fromkeys(str(i) for i in idea_ids))
+            self._touch()
+
+    def submit_full(self):
+        """
+        Запрос на полную перестройку кластеров
+        """
+        with self._cond:
+            self._full_pending = True
+            self._touch()
+
+    def status(self) -> dict:
+        with self._cond:
+            pending = self._has_pending()
+            return {
+                "version": self.version,
+                "pending": pending,
+                "running": self._running,
+                "pending_ideas": len(self._pending_ids),
+                "full_rebuild_pending": self._full_pending,
+                "oldest_pending_seconds": round(time.monotonic() - self._first_request_at, 3) if pending else None,
+                "last_built_at": self.last_built_at,
+                "last_duration_seconds": self.last_duration,
+                "last_error": self.last_error
+            }
+
+    def _touch(self):
+        now = time.monotonic()
+        if self._first_request_at is None:
+            self._first_request_at = now
+        self._last_request_at = now
+        self._cond.notify_all()
+
+    def _has_pending(self) -> bool:
+        return self._full_pending or bool(self._pending_ids)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._has_pending():
+                    self._cond.wait()
+                if not self._has_pending():
+                    return
+
+                while not self._stopped:
+                    deadline = min(self._last_request_at + self.debounce_seconds,
+                                   self._first_request_at + self.max_staleness_seconds)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                idea_ids = list(self._pending_ids)
+                full = self._full_pending or self.mode == 'full'
+                self._pending_ids = {}
+                self._full_pending = False
+                self._first_request_at = None
+                self._last_request_at = None
+                self._running = True
+
+            start_time = time.perf_counter()
+            error = None
+            try:
+                if full:
+                    self.db.process_clusters()
+                else:
+                    self.db.update_clusters(idea_ids)
+            except Exception:
+                error = traceback.format_exc()
+                print(f"Ошибка фоновой перекластеризации:\n{error}")
+
+            with self._cond:
+                self._running = False
+                self.last_duration = round(time.perf_counter() - start_time, 3)
+                self.last_error = error
+                if error is None:
+                    self.version += 1
+                    self.last_built_at = time.time()
+                elif not self._stopped:
+                    # повтор не раньше следующей паузы debounce_seconds; при остановке не повторяется
+                    self._pending_ids = {**dict.fromkeys(idea_ids), **self._pending_ids}
+                    self._full_pending = self._full_pending or full
+                    self._touch()
+                self._cond.notify_all()
@@ -1 +1 @@
-from .config import DB_SETTINGS
\ No newline at end of file
+from .config import DB_SETTINGS, POOL_SETTINGS, INDEX_SETTINGS, CLUSTER_SETTINGS, INGEST_SETTINGS, ENCODE_SETTINGS, CACHE_SETTINGS, SPACY_SETTINGS, STORAGE_SETTINGS, SEARCH_SETTINGS, METRICS_SETTINGS, LOGGING_SETTINGS
\ No newline at end of file
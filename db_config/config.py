@@ -6,4 +6,67 @@ DB_SETTINGS = {
     'dbname': 'ideas_db',
     'user': 'myuser',
     'password': 'mypassword'
+}
+
+POOL_SETTINGS = {
+    'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10'))
+}
+
+INDEX_SETTINGS = {
+    'backend': os.getenv('INDEX_BACKEND', 'exact'),
+    'hnsw_m': int(os.getenv('HNSW_M', '16')),
+    'hnsw_ef_construction': int(os.getenv('HNSW_EF_CONSTRUCTION', '200')),
+    'hnsw_ef_search': int(os.getenv('HNSW_EF_SEARCH', '64'))
+}
+
+CLUSTER_SETTINGS = {
+    'mode': os.getenv('CLUSTER_MODE', 'incremental'),
+    'background': os.getenv('CLUSTER_BACKGROUND', '1') == '1',
+    'debounce_seconds': float(os.getenv('CLUSTER_DEBOUNCE_SECONDS', '2')),
+    'max_staleness_seconds': float(os.getenv('CLUSTER_MAX_STALENESS_SECONDS', '30')),
+    'memory_limit_mb': float(os.getenv('CLUSTER_MEMORY_LIMIT_MB', '256')),
+    'workers': int(os.getenv('CLUSTER_WORKERS', '0')) or None
+}
+
+INGEST_SETTINGS = {
+    'encode_batch_size': int(os.getenv('ENCODE_BATCH_SIZE', '64'))
+}
+
+ENCODE_SETTINGS = {
+    'max_batch_size': int(os.getenv('ENCODE_MAX_BATCH_SIZE', '32')),
+    'max_wait_ms': float(os.getenv('ENCODE_MAX_WAIT_MS', '5'))
+}
+
+CACHE_SETTINGS = {
+    'max_items': int(os.getenv('EMBEDDING_CACHE_ITEMS', '10000')),
+    'path': os.getenv('EMBEDDING_CACHE_PATH', 'cache/embeddings.sqlite')
+}
+
+SPACY_SETTINGS = {
+    'batch_size': int(os.getenv('SPACY_BATCH_SIZE', '256')),
+    'n_process': int(os.getenv('SPACY_N_PROCESS', '1')),
+    'cache_size': int(os.getenv('SPACY_CACHE_SIZE', '50000'))
+}
+
+STORAGE_SETTINGS = {
+    'embedding_storage': os.getenv('EMBEDDING_STORAGE', 'float8'),
+    'embedding_dim': int(os.getenv('EMBEDDING_DIM', '768'))
+}
+
+SEARCH_SETTINGS = {
+    'backend': os.getenv('SEARCH_BACKEND', 'memory'),
+    'pgvector_index': os.getenv('PGVECTOR_INDEX', 'hnsw'),
+    'ivfflat_lists': int(os.getenv('IVFFLAT_LISTS', '100')),
+    'ivfflat_probes': int(os.getenv('IVFFLAT_PROBES', '10'))
+}
+
+METRICS_SETTINGS = {
+    'server_timing': os.getenv('SERVER_TIMING', '0') == '1'
+}
+
+LOGGING_SETTINGS = {
+    'queue': os.getenv('LOG_QUEUE', '1') == '1',
+    'format': os.getenv('LOG_FORMAT', 'text'),
+    'request_sample_rate': float(os.getenv('LOG_REQUEST_SAMPLE_RATE', '1'))
 }
\ No newline at end of file
@@ -5,9 +5,15 @@ db = Company_DB(**DB_SETTINGS)
 
 print("✅ Инициализация базы данных...")
 
-db.init_db_ideas()
-db.init_db_clusters()
+if db.has_pending_import("data.csv"):
+    print("✅ Продолжение прерванной загрузки data.csv...")
+else:
+    db.init_db_ideas()
+    db.init_db_clusters()
+
 db.load_data_from_csv("data.csv")
+if db.embedding_storage == 'vector':
+    db.create_vector_index()
 db.process_clusters()
 
 print("✅ Готово!")
\ No newline at end of file
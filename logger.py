@@ -1,17 +1,62 @@
+import atexit
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 import os
+import queue
 
-def setup_logger(name="main", log_dir="logs"):
+# атрибуты, которые есть у любой записи; всё остальное пришло через extra и попадает в JSON как поля
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись лога одной строкой JSON: время, уровень, логгер, сообщение, поля из extra и трассировка
+    """
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler для очереди внутри процесса: запись кладётся как есть,
+    форматирование сообщения и трассировки выполняет поток QueueListener
+    """
+    def prepare(self, record):
+        return record
+
+
+def setup_logger(name="main", log_dir="logs", use_queue=False, log_format="text"):
+    """
+    Логгер с записью в logs/app.log (ротация в полночь) и в консоль.
+    use_queue=True — вызов логгера только кладёт запись в очередь, файлом и консолью
+    владеет отдельный поток QueueListener; log_format="json" — записи в JSON.
+    """
     os.makedirs(log_dir, exist_ok=True)
 
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
 
-    formatter = logging.Formatter(
-        fmt='[%(asctime)s] %(levelname)s %(name)s: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if log_format == "json":
+        formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+    else:
+        formatter = logging.Formatter(
+            fmt='[%(asctime)s] %(levelname)s %(name)s: %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
 
     file_handler = TimedRotatingFileHandler(
         filename=os.path.join(log_dir, "app.log"),
@@ -26,7 +71,15 @@ def setup_logger(name="main", log_dir="logs"):
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        listener.start()
+        # при выходе оставшиеся в очереди записи дописываются
+        atexit.register(listener.stop)
+        logger.addHandler(_LocalQueueHandler(log_queue))
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
 
     return logger
\ No newline at end of file
@@ -1,23 +1,47 @@
 from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from contextlib import asynccontextmanager
 from logger import setup_logger
 from utils.embedding import match_new_idea_to_old_db
-from db import Company_DB
-from db_config import DB_SETTINGS
+from utils.model_registry import model_registry, DEFAULT_MODEL_NAME
+from utils.encoder import encode_service
+from utils.embedding_cache import embedding_cache
+from utils.metrics import request_duration, render_metrics, server_timing_header, start_request_timing
+from db import Company_DB, ReclusterWorker
+from db_config import DB_SETTINGS, POOL_SETTINGS, CLUSTER_SETTINGS, INGEST_SETTINGS, ENCODE_SETTINGS, METRICS_SETTINGS, LOGGING_SETTINGS
 from pydantic import BaseModel
+import asyncio
+import logging
+import random
 import time
 import traceback
 
-logger = setup_logger()
+logger = setup_logger(use_queue=LOGGING_SETTINGS['queue'], log_format=LOGGING_SETTINGS['format'])
+
+def warmup_model():
+    try:
+        model_registry.warmup(DEFAULT_MODEL_NAME)
+        logger.info(f"Model loaded: {model_registry.stats()[DEFAULT_MODEL_NAME]}")
+    except Exception:
+        logger.error("Model warmup failed:")
+        logger.error(traceback.format_exc())
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application started.")
+    await asyncio.to_thread(db.ensure_cluster_members)
+    await asyncio.to_thread(db.build_index)
+    await asyncio.to_thread(db.build_centroids)
+    recluster_worker.start()
+    encode_service.start(**ENCODE_SETTINGS)
+    warmup_task = asyncio.create_task(asyncio.to_thread(warmup_model))
     yield
+    warmup_task.cancel()
+    await asyncio.to_thread(encode_service.stop)
+    await asyncio.to_thread(recluster_worker.stop)
     logger.info("Application stopped.")
 
 app = FastAPI(lifespan=lifespan)
@@ -25,7 +49,25 @@ app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="pages"), name="static")
 templates = Jinja2Templates(directory="pages")
 
-db = Company_DB(**DB_SETTINGS)
+db = Company_DB(**DB_SETTINGS, **POOL_SETTINGS)
+recluster_worker = ReclusterWorker(
+    db,
+    mode=CLUSTER_SETTINGS['mode'],
+    debounce_seconds=CLUSTER_SETTINGS['debounce_seconds'],
+    max_staleness_seconds=CLUSTER_SETTINGS['max_staleness_seconds']
+)
+
+def recluster(idea_ids: list[str]):
+    """
+    Обновление кластеров после записи: инкрементально или полной перестройкой (CLUSTER_MODE),
+    в фоне с debounce (CLUSTER_BACKGROUND=1) или прямо в запросе
+    """
+    if CLUSTER_SETTINGS['background']:
+        recluster_worker.submit(idea_ids)
+    elif CLUSTER_SETTINGS['mode'] == 'incremental':
+        db.update_clusters(idea_ids)
+    else:
+        db.process_clusters()
 
 class UpdateRequest(BaseModel):
     idea_id: str
@@ -37,23 +79,50 @@ class Idea(BaseModel):
     description: str
     idea_id: str
 
+class BulkIdeas(BaseModel):
+    ideas: list[Idea]
+    update_existing: bool = False
+
 class DeleteRequest(BaseModel):
     idea_id: str
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
-        logger.info(f"Request: {request.method} {request.url.path}")
+        timings = start_request_timing() if METRICS_SETTINGS['server_timing'] else None
+        # обычные запросы логируются с долей LOG_REQUEST_SAMPLE_RATE, ошибки — всегда
+        sample_rate = LOGGING_SETTINGS['request_sample_rate']
+        sampled = random.random() < sample_rate
+        if sampled:
+            logger.info("Request: %s %s", request.method, request.url.path)
 
         try:
             response = await call_next(request)
         except Exception as e:
-            logger.error("Unhandled exception:")
-            logger.error(traceback.format_exc())
-            return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+            logger.exception("Unhandled exception:")
+            response = JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+
+        elapsed = time.time() - start_time
+        # шаблон маршрута вместо пути, чтобы число рядов метрики не росло с idea_id
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        request_duration.observe((request.method, path, str(response.status_code)), elapsed)
+        if timings is not None:
+            response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
 
-        duration = round(time.time() - start_time, 4)
-        logger.info(f"Response: {request.method} {request.url.path} - {response.status_code} in {duration}s")
+        if sampled or response.status_code >= 500:
+            duration = round(elapsed, 4)
+            logger.log(
+                logging.ERROR if response.status_code >= 500 else logging.INFO,
+                "Response: %s %s - %s in %ss", request.method, request.url.path, response.status_code, duration,
+                extra={
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": response.status_code,
+                    "duration": duration,
+                    "sample_rate": sample_rate if response.status_code < 500 else 1.0
+                }
+            )
         return response
 
 app.add_middleware(LoggingMiddleware)
@@ -62,8 +131,23 @@ app.add_middleware(LoggingMiddleware)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/ready")
+async def ready():
+    """
+    Готовность сервиса: успех только после загрузки модели и индекса эмбеддингов.
+    """
+    index_ready = db.index is not None or db.search_backend == 'pgvector'
+    if not model_registry.is_loaded(DEFAULT_MODEL_NAME) or not index_ready:
+        return JSONResponse(status_code=503, content={"status": "loading", "model": DEFAULT_MODEL_NAME})
+    return {
+        "status": "ready",
+        "models": model_registry.stats(),
+        "search_backend": db.search_backend,
+        "indexed_ideas": len(db.index) if db.index is not None else None
+    }
+
 @app.post("/add_idea")
-async def add_idea(idea: Idea):
+def add_idea(idea: Idea):
     """
     Добавляет новую идею в базу данных.
     Если идея уже существует, она не добавляется.
@@ -76,14 +160,102 @@ async def add_idea(idea: Idea):
             return {"status": "skipped", "reason": f"Идея с ID {idea.idea_id} уже существует"}
 
         db.add_new_ideas([(idea.idea_id, idea.title, idea.description)])
-        db.process_clusters()
+        recluster([idea.idea_id])
         return {"status": "ok", "idea_id": idea.idea_id}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rebuild_clusters")
+def rebuild_clusters():
+    """
+    Полная перекластеризация всех идей.
+    В фоновом режиме перестройка ставится в очередь, прогресс — в /cluster_status.
+    """
+    if CLUSTER_SETTINGS['background']:
+        recluster_worker.submit_full()
+        return {"status": "scheduled", **recluster_worker.status()}
+    try:
+        db.process_clusters()
+        return {"status": "rebuilt"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/add_ideas")
+def add_ideas(payload: BulkIdeas):
+    """
+    Пакетное добавление идей.
+    Существующие идеи пропускаются или обновляются (update_existing),
+    идеи без ID и повторы внутри запроса пропускаются.
+    Кластеры пересчитываются один раз после записи всего пакета.
+    """
+    unique = {}
+    skipped = 0
+    for idea in payload.ideas:
+        idea_id = idea.idea_id.strip()
+        if not idea_id or idea_id in unique:
+            skipped += 1
+            continue
+        unique[idea_id] = idea
+
+    try:
+        existing = db.existing_idea_ids(list(unique))
+        rows = []
+        for idea_id, idea in unique.items():
+            if idea_id in existing and not payload.update_existing:
+                skipped += 1
+                continue
+            rows.append((idea_id, idea.title, idea.description))
+
+        if rows:
+            db.add_new_ideas(rows, batch_size=INGEST_SETTINGS['encode_batch_size'])
+            if CLUSTER_SETTINGS['background']:
+                recluster_worker.submit_full()
+            else:
+                db.process_clusters()
+
+        updated = sum(1 for idea_id, _, _ in rows if idea_id in existing)
+        return {
+            "status": "ok",
+            "inserted": len(rows) - updated,
+            "updated": updated,
+            "skipped": skipped
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/idea_clusters/{idea_id}")
+def idea_clusters(idea_id: str):
+    """
+    Подгруппы, в которые входит идея.
+    """
+    return {"idea_id": idea_id, "clusters": db.find_idea_clusters(idea_id)}
+
+@app.get("/cluster_status")
+async def cluster_status():
+    """
+    Версия кластеров и наличие ожидающей перекластеризации.
+    build — последняя полная перестройка таблицы clusters (версия, время, длительность).
+    """
+    build = await asyncio.to_thread(db.cluster_build_info)
+    return {**recluster_worker.status(), "build": build}
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    Заполненность кэша эмбеддингов и счётчики попаданий/промахов.
+    """
+    return embedding_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Гистограммы длительности этапов и HTTP-запросов в текстовом формате Prometheus.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/results")
-async def get_results(title: str = Form(...), description: str = Form(...)):
+def get_results(title: str = Form(...), description: str = Form(...)):
     """
     Получает результаты поиска по идее.
     Возвращает список похожих идей и лучшую группу.
@@ -99,7 +271,7 @@ async def get_results(title: str = Form(...), description: str = Form(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/check_idea/", response_class=HTMLResponse)
-async def check_idea(request: Request, title: str = Form(...), description: str = Form(...)):
+def check_idea(request: Request, title: str = Form(...), description: str = Form(...)):
     combined_text = title + " " + description
     results, best_group = match_new_idea_to_old_db(combined_text, db)
     return templates.TemplateResponse("index.html", {
@@ -131,7 +303,7 @@ def update_idea(payload: UpdateRequest):
     if db.idea_exists(payload.idea_id):
         try:
             db.add_new_ideas([(payload.idea_id, payload.title, payload.description)])
-            db.process_clusters()
+            recluster([payload.idea_id])
             return {"status": "updated", "idea_id": payload.idea_id}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка при обновлении: {str(e)}")
@@ -0,0 +1,14 @@
+import sys
+from db.db_class import Company_DB
+from db_config.config import DB_SETTINGS, STORAGE_SETTINGS
+
+storage = sys.argv[1] if len(sys.argv) > 1 else STORAGE_SETTINGS['embedding_storage']
+
+db = Company_DB(**DB_SETTINGS, embedding_storage=storage, search_backend='memory')
+
+print(f"✅ Перевод эмбеддингов в формат {storage}...")
+
+db.migrate_embedding_storage(storage)
+db.close()
+
+print("✅ Готово!")
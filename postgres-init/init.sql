@@ -1,3 +1,5 @@
+CREATE EXTENSION IF NOT EXISTS vector;
+
 CREATE TABLE IF NOT EXISTS ideas (
     idea_id SERIAL PRIMARY KEY,
     idea_title TEXT,
@@ -0,0 +1,94 @@
+"""
+Открытие JSONL-хранилища: чтение не меняет файл данных, недописанный хвост отбрасывается только при дозаписи
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.jsonl import JsonlStore, json_delete, json_load, json_update
+
+
+def _write(path, text: str) -> None:
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def _lines(*records) -> str:
+    return '\n'.join(json.dumps(record, ensure_ascii=False) for record in records)
+
+
+def test_last_line_without_newline_is_read(tmp_path):
+    path = tmp_path / 'e.jsonl'
+    content = _lines({"idea_id": "1", "context": ["a"]}, {"idea_id": "2", "context": ["b"]})
+    _write(path, content)
+
+    idea_ids, contexts, _ = json_load(str(path))
+
+    assert idea_ids == ['1', '2']
+    assert contexts == [['a'], ['b']]
+    assert path.read_text(encoding='utf-8') == content
+
+
+def test_append_after_last_line_without_newline(tmp_path):
+    path = tmp_path / 'e.jsonl'
+    _write(path, _lines({"idea_id": "1", "context": []}, {"idea_id": "2", "context": []}))
+
+    json_update(str(path), '3', new_context=['c'], mode='add')
+    json_update(str(path), '2', new_context=['b'])
+
+    assert json_load(str(path))[:2] == (['1', '2', '3'], [[], ['b'], ['c']])
+    assert JsonlStore(str(path)).load()[:2] == (['1', '2', '3'], [[], ['b'], ['c']])
+
+
+def test_torn_write_is_skipped_on_read_and_dropped_on_append(tmp_path):
+    path = tmp_path / 'e.jsonl'
+    content = _lines({"idea_id": "1", "context": []}) + '\n' + '{"idea_id": "2", "tor'
+    _write(path, content)
+
+    assert json_load(str(path))[0] == ['1']
+    assert path.read_text(encoding='utf-8') == content
+
+    assert json_delete(str(path), '1')
+    json_update(str(path), '3', new_context=['c'], mode='add')
+
+    assert json_load(str(path))[:2] == (['3'], [['c']])
+    assert '"tor' not in path.read_text(encoding='utf-8')
+    assert JsonlStore(str(path)).ids() == ['3']
+
+
+def test_missing_file_raises(tmp_path):
+    path = tmp_path / 'missing.jsonl'
+
+    with pytest.raises(FileNotFoundError):
+        json_load(str(path))
+    assert not path.exists()
+
+
+def test_index_that_cannot_be_written_stays_in_memory(tmp_path, monkeypatch):
+    import utils.jsonl as jsonl
+
+    def read_only_open(file, mode='r', *args, **kwargs):
+        if str(file).endswith(JsonlStore.INDEX_SUFFIX) and mode != 'rb':
+            raise PermissionError(13, 'Read-only file system', str(file))
+        return open(file, mode, *args, **kwargs)
+
+    def read_only_mkstemp(*args, **kwargs):
+        raise PermissionError(13, 'Read-only file system')
+
+    path = tmp_path / 'e.jsonl'
+    _write(path, _lines({"idea_id": "1", "context": []}, {"idea_id": "2", "context": []}) + '\n')
+    monkeypatch.setattr(jsonl, 'open', read_only_open, raising=False)
+    monkeypatch.setattr(jsonl.tempfile, 'mkstemp', read_only_mkstemp)
+
+    assert json_load(str(path))[0] == ['1', '2']
+    json_update(str(path), '3', new_context=['c'], mode='add')
+    assert json_load(str(path))[0] == ['1', '2', '3']
+    assert not (tmp_path / 'e.jsonl.idx').exists()
+
+    monkeypatch.undo()
+    assert JsonlStore(str(path)).ids() == ['1', '2', '3']
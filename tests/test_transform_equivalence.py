@@ -0,0 +1,169 @@
+"""
+Эквивалентность скомпилированных get_key_words/get_clean_text исходной реализации
+(эталон ниже — код функций до оптимизации).
+"""
+import random
+import re
+import sys
+import types
+from pathlib import Path
+from typing import List
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class _FakeNLP:
+    """
+    Заглушка модели spaCy: тесты не требуют ru_core_news_lg и сети
+    """
+    pipe_names = ['ner']
+
+    def select_pipes(self, enable=None, disable=None):
+        return None
+
+    def get_pipe(self, name):
+        return types.SimpleNamespace(listening_components=[])
+
+    def pipe(self, texts, **kwargs):
+        for text in texts:
+            yield types.SimpleNamespace(text=text, ents=[])
+
+
+spacy = sys.modules.get('spacy')
+if spacy is None:
+    try:
+        import spacy
+    except ImportError:
+        spacy = sys.modules['spacy'] = types.ModuleType('spacy')
+_original_load = getattr(spacy, 'load', None)
+spacy.load = lambda name, **kwargs: _FakeNLP()
+try:
+    from utils.transform import get_key_words, get_clean_text
+finally:
+    if _original_load is not None:
+        spacy.load = _original_load
+
+
+def reference_get_key_words(texts: List[str]) -> list[list]:
+    word_pattern = r'\b[А-ЯA-ZЁё0-9][А-Яа-яA-Za-zЁё0-9\-\/\.\"()]{1,}\b'
+    date_pattern = r'(\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}[./-]\d{1,2}[./-]\d{1,2})'
+    number_pattern = r'^\d+([.,]\d+)?$'
+    money_pattern = r'\b\d{1,9}(?:[ \u00A0]\d{3})*\s*(?:руб(?:лей|\.|)|р|₽)\b'
+    tariff_pattern = r'\b\d{1,9}\s?(?:руб(?:лей|\.|)|р|₽)[/\\][а-яa-z0-9]+'
+    range_pattern = r'\b\d{1,4}[-/]\d{1,4}\b'
+
+    key_words_list = []
+    for text in texts:
+        found = re.findall(word_pattern, text)
+        filtered = []
+        for w in found:
+            if re.fullmatch(date_pattern, w):
+                continue
+            if re.fullmatch(range_pattern, w):
+                continue
+            if re.fullmatch(tariff_pattern, w, re.IGNORECASE):
+                continue
+            if re.fullmatch(money_pattern, w, re.IGNORECASE):
+                continue
+            if re.fullmatch(number_pattern, w):
+                continue
+            if any(c.isdigit() for c in w) and w[-1].islower():
+                continue
+            if len(w) >= 3 and w.isupper():
+                filtered.append(w)
+                continue
+            if any(c.isdigit() for c in w) or any(c in w for c in '-/()."'):
+                filtered.append(w)
+                continue
+        seen = set()
+        unique_filtered = []
+        for w in filtered:
+            if w not in seen:
+                unique_filtered.append(w)
+                seen.add(w)
+        key_words_list.append(unique_filtered)
+    return key_words_list
+
+
+def reference_get_clean_text(texts: List[str], key_words_list: list[list]) -> list[str]:
+    cleaned_texts = []
+    for text, key_words in zip(texts, key_words_list):
+        for word in key_words:
+            text = re.sub(rf'\b{re.escape(word)}\b', '', text, flags=re.IGNORECASE)
+        cleaned_texts.append(text)
+    return cleaned_texts
+
+
+CASES = [
+    # даты
+    'Срок до 12.03.2024, продление до 2025-01-15 и 1/2/25',
+    'Поставка 31-12-2023 по договору 2024/05/07',
+    # диапазоны
+    'Давление 10-16 атм, ряд 1/2 и 2023-2024 годы, диапазон 100-200',
+    # тарифы и суммы
+    'Тариф 150 руб/час, 200р/кг, 300₽/шт и 45 РУБ/м3',
+    'Экономия 1 500 000 руб. в год, затраты 250 рублей, 99₽, 12 000 р',
+    'Сумма 7 000 руб и 5руб., с неразрывным пробелом 7\u00a0000 руб',
+    # числа
+    'Всего 42 идеи, доля 3.5 и 7,25, код 0012',
+    # аббревиатуры и организации
+    'ПАО "Газпром" и ООО «Газпром трансгаз Ухта» на КС ГТС, ЛПУМГ',
+    'АО "ОДК" поставит ГПА-Ц-16 для ДКС, СТО 2-2.3-141',
+    # ключевые слова со знаками
+    'Узел Ду-700 (PN-100), схема А/Б, файл Отчет.docx, "Кавычки" и (Скобки)',
+    'Изделие ГТК-10-4/ГПА, вариант В.2, АВО-2.',
+    # регистр
+    'ГТС гтс Гтс ГтС и КС кс, АСУТП асутп',
+    'гпа-ц-16 и ГПА-Ц-16, Ду-700 ду-700 ДУ-700',
+    # слова с цифрами, оканчивающиеся на строчную букву
+    'Модель 5кВт, 10шт, 3D-печать, Т-34а и 2Б',
+    # повторы и спецсимволы регулярных выражений
+    'ГТС ГТС ГТС (ГТС) [ГТС] ГТС.ГТС ГТС-1 ГТС+ ГТС*',
+    'Ёлка ЁЖ ЁЖИК ёж, ЁЁЁ и Ё-1',
+    '',
+    'просто текст без ключевых слов',
+]
+
+
+@pytest.mark.parametrize('text', CASES)
+def test_key_words_match_reference(text):
+    assert get_key_words([text]) == reference_get_key_words([text])
+
+
+@pytest.mark.parametrize('text', CASES)
+def test_clean_text_matches_reference(text):
+    key_words = reference_get_key_words([text])
+    assert get_clean_text([text], key_words) == reference_get_clean_text([text], key_words)
+
+
+def test_clean_text_with_mixed_case_key_words():
+    texts = ['ГТС и гтс, Ду-700 и ду-700', 'КС.КС и кс']
+    key_words_list = [['гтс', 'ДУ-700'], ['КС', 'кс', 'КС.КС']]
+    assert get_clean_text(texts, key_words_list) == reference_get_clean_text(texts, key_words_list)
+
+
+TOKENS = [
+    'ГТС', 'гтс', 'КС', 'ПАО', '"Газпром"', '«Ухта»', 'ГПА-Ц-16', 'Ду-700', 'ду-700', 'PN-100', 'А/Б',
+    '12.03.2024', '2024-01-15', '1/2', '10-16', '150', 'руб', 'руб.', 'рублей', 'р', '₽', '/час', '/кг',
+    '1 500', '1\u00a0500', '000', '3.5', '7,25', '5кВт', '2Б', 'Т-34а', '(ГТС)', 'В.2', 'Ёж', 'ЁЖ', 'насос', 'ремонт',
+    'Замена', 'и', ',', '.', '(', ')', '-', '/', '"', 'X1', 'x1', 'ABC', 'Abc', '2023-2024'
+]
+
+
+def _random_texts(count: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        parts = rnd.choices(TOKENS, k=rnd.randint(0, 20))
+        separators = rnd.choices(['', ' ', ' ', ' ', '\u00a0'], k=len(parts))
+        texts.append(''.join(sep + part for sep, part in zip(separators, parts)))
+    return texts
+
+
+def test_random_texts_match_reference():
+    texts = _random_texts(3000)
+    key_words = get_key_words(texts)
+    assert key_words == reference_get_key_words(texts)
+    assert get_clean_text(texts, key_words) == reference_get_clean_text(texts, key_words)
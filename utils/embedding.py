@@ -1,25 +1,44 @@
+import hashlib
 import json
+import os
+import tempfile
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Tuple
 from sklearn.cluster import DBSCAN
 from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
 from utils.jsonl import *
 from utils.embedding import *
 from utils.transform import *
-
-def compute_embeddings(texts: List[str], model_name: str = 'cointegrated/LaBSE-en-ru') -> np.ndarray:
+from utils.model_registry import model_registry, DEFAULT_MODEL_NAME
+from utils.encoder import encode_query
+from utils.embedding_cache import embedding_cache
+from utils.index import radius_neighbors_graph
+from utils.metrics import span
+
+def compute_embeddings(
+    texts: List[str],
+    model_name: str = DEFAULT_MODEL_NAME,
+    batch_size: int = 32
+) -> np.ndarray:
     """
-    Эмбеддинги для списка из строк в full_text
+    Эмбеддинги для списка из строк в full_text, кодирование батчами по batch_size.
+    Уже встречавшиеся тексты берутся из кэша, модель кодирует только промахи.
     """
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    return embeddings
+    def encode(missing):
+        model = model_registry.get(model_name)
+        return model.encode(missing, batch_size=batch_size, show_progress_bar=True, convert_to_numpy=True)
+
+    return embedding_cache.encode(texts, model_name, encode)
 
-def cluster_embeddings(idea_ids, embeddings, eps=0.25, min_samples=2):
-        clustering = DBSCAN(metric='cosine', eps=eps, min_samples=min_samples)
-        labels = clustering.fit_predict(embeddings)
+def cluster_embeddings(idea_ids, embeddings, eps=0.25, min_samples=2, memory_limit_mb=256, workers=None):
+        """
+        DBSCAN по косинусному расстоянию на заранее построенном разреженном графе соседей в радиусе eps:
+        полная матрица расстояний N×N не строится, пиковая память блоков — не больше memory_limit_mb
+        """
+        graph = radius_neighbors_graph(embeddings, eps, memory_limit_mb=memory_limit_mb, workers=workers)
+        clustering = DBSCAN(metric='precomputed', eps=eps, min_samples=min_samples)
+        labels = clustering.fit_predict(graph)
 
         df = pd.DataFrame({
             'idea_id': idea_ids,
@@ -31,101 +50,92 @@ def match_new_idea_to_old_db(
     new_text: str,
     db,
     top_n: int = 15,
-    model_name: str = 'cointegrated/LaBSE-en-ru'
+    model_name: str = DEFAULT_MODEL_NAME
 ) -> Tuple[List[Tuple[str, str, float]], Dict]:
     """
     Принимает новую идею и:
     - Возвращает топ-N похожих идей [(idea_id, полный_текст, %_сходства), ...]
     - Самый похожий кластер из таблицы clusters
-    """
-    new_key_words = get_key_words([new_text])
-    new_key_words_filtered = filter_organizations_spacy(new_key_words[0])
-    new_cleaned_text = get_clean_text([new_text], [new_key_words_filtered])[0]
-
-    model = SentenceTransformer(model_name)
-    new_embedding = model.encode([new_cleaned_text], convert_to_numpy=True)[0]
-
-    db.cursor.execute('SELECT idea_id, idea_title, idea_description, idea_embedding FROM ideas')
-    rows = db.cursor.fetchall()
 
-    idea_ids = []
-    full_texts = []
-    old_embeddings = []
-
-    idea_id_to_embedding = {}
-
-    for idea_id, title, description, embedding in rows:
-        if embedding is None:
-            continue
-        idea_ids.append(idea_id)
-        full_texts.append(f"{title.strip()} {description.strip()}")
-        old_embeddings.append(embedding)
-        idea_id_to_embedding[str(idea_id)] = embedding
-
-    if not old_embeddings:
-        return [], {}
-
-    old_embeddings = np.array(old_embeddings)
-    similarities = cosine_similarity([new_embedding], old_embeddings)[0]
-    ranked_indices = np.argsort(similarities)[::-1]
+    Поиск идёт по резидентному индексу db.index и матрице центроидов db.centroids,
+    если они построены, иначе они собираются из БД на время запроса.
+    При db.search_backend == 'pgvector' топ-N и лучшая подгруппа ищутся в PostgreSQL.
+    Длительность каждого этапа пишется в метрики (utils.metrics).
+    """
+    operation = 'match_new_idea_to_old_db'
+    with span(operation, 'key_words'):
+        new_key_words = get_key_words([new_text])
+    with span(operation, 'organizations'):
+        new_key_words_filtered = filter_organizations_spacy(new_key_words[0])
+    with span(operation, 'clean_text'):
+        new_cleaned_text = get_clean_text([new_text], [new_key_words_filtered])[0]
+
+    with span(operation, 'encode'):
+        new_embedding = encode_query(new_cleaned_text, model_name)
+
+    if db.search_backend == 'pgvector':
+        with span(operation, 'similar_search'):
+            matches = db.search_similar(new_embedding, top_n)
+        if not matches:
+            return [], {}
+        with span(operation, 'cluster_scoring'):
+            best = db.best_cluster(new_embedding)
+    else:
+        with span(operation, 'ideas_fetch'):
+            index = db.index if db.index is not None else db.load_index()
+        if not len(index):
+            return [], {}
+        with span(operation, 'similar_search'):
+            matches = index.search(new_embedding, top_n)
+        with span(operation, 'cluster_scoring'):
+            centroids = db.centroids if db.centroids is not None else db.load_centroids()
+            best = centroids.best(new_embedding)
 
     results = []
-    for idx in ranked_indices[:top_n]:
-        matched_text = full_texts[idx]
-        idea_id = idea_ids[idx]
-        similarity_percent = round(similarities[idx] * 100, 2)
+    for idea_id, matched_text, similarity in matches:
+        similarity_percent = round(similarity * 100, 2)
         results.append((idea_id, matched_text, similarity_percent))
 
-    db.cursor.execute("SELECT cluster_id, clusters FROM clusters")
-    cluster_rows = db.cursor.fetchall()
-
-    best_cluster = None
-    best_score = -1
-
-    for cluster_id, cluster_idea_ids in cluster_rows:
-        cluster_vectors = [
-            idea_id_to_embedding[str(idea_id)]
-            for idea_id in cluster_idea_ids
-            if str(idea_id) in idea_id_to_embedding
-        ]
-
-        if not cluster_vectors:
-            continue
-
-        cluster_mean_vector = np.mean(cluster_vectors, axis=0)
-        score = cosine_similarity([new_embedding], [cluster_mean_vector])[0][0]
-
-        if score > best_score:
-            best_score = score
-            best_cluster = {
-                "cluster_id": cluster_id,
-                "idea_ids": cluster_idea_ids,
-                "similarity": round(score * 100, 2)
-            }
+    best_cluster = {}
+    if best is not None:
+        cluster_id, cluster_idea_ids, score = best
+        best_cluster = {
+            "cluster_id": cluster_id,
+            "idea_ids": cluster_idea_ids,
+            "similarity": round(score * 100, 2)
+        }
 
-    return results, best_cluster if best_cluster else {}
+    return results, best_cluster
 
 def match_new_idea_to_old_jsonl(
     new_text: str,
     df: pd.DataFrame,
     top_n: int = 15,
-    model_name: str = 'cointegrated/LaBSE-en-ru',
-    grouped_path: str = 'grouped_ideas.json'
+    model_name: str = DEFAULT_MODEL_NAME,
+    grouped_path: str = 'grouped_ideas.json',
+    embeddings_path: str = 'embeddings.jsonl',
+    npy_path: str = 'embeddings.npy'
 ) -> Tuple[List[Tuple[str, str, float]], Dict]:
     """
     Принимает новую идею и:
     - Возвращает топ-N похожих идей [(idea_id, полный_текст, %_сходства), ...]
     - Наиболее близкую подгруппу из grouped_ideas.json
+    Эмбеддинги берутся из бинарной копии npy_path, если она не старше embeddings_path,
+    иначе из JSONL.
     """
-    idea_ids, old_key_words, old_embeddings = json_load('embeddings.jsonl')
+    if os.path.exists(npy_path) and (
+        not os.path.exists(embeddings_path) or os.path.getmtime(npy_path) >= os.path.getmtime(embeddings_path)
+    ):
+        idea_ids, old_embeddings = npy_load(npy_path)
+    else:
+        idea_ids, _, old_embeddings = json_load(embeddings_path)
     old_texts = df.set_index('idea_id').loc[idea_ids]['full_text'].tolist()
 
     new_key_words = get_key_words([new_text])
     new_key_words_filtered = filter_organizations_spacy(new_key_words[0])
     new_cleaned_text = get_clean_text([new_text], [new_key_words_filtered])[0]
 
-    model = SentenceTransformer(model_name)
-    new_embedding = model.encode([new_cleaned_text], convert_to_numpy=True)[0]
+    new_embedding = encode_query(new_cleaned_text, model_name)
 
     similarities = cosine_similarity([new_embedding], old_embeddings)[0]
     ranked_indices = np.argsort(similarities)[::-1]
@@ -137,24 +147,63 @@ def match_new_idea_to_old_jsonl(
         similarity_percent = round(similarities[idx] * 100, 2)
         results.append((idea_id, matched_text, similarity_percent))
 
-    best_group = None
-    best_score = -1
-
     try:
-        with open(grouped_path, "r", encoding="utf-8") as f:
-            grouped_ideas = json.load(f)
+        grouped_ideas, centroids = load_group_centroids(grouped_path, model_name)
+    except FileNotFoundError:
+        return results, {}
 
-        for group in grouped_ideas:
-            group_texts = group['texts']
-            group_embs = model.encode(group_texts, convert_to_numpy=True)
-            group_mean_emb = np.mean(group_embs, axis=0)
-            score = cosine_similarity([new_embedding], [group_mean_emb])[0][0]
+    best_group = None
+    if len(grouped_ideas) and centroids.shape[1]:
+        scores = cosine_similarity([new_embedding], np.nan_to_num(centroids))[0]
+        scores[np.isnan(centroids).any(axis=1)] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] > -1:
+            best_group = grouped_ideas[best]
 
-            if score > best_score:
-                best_score = score
-                best_group = group
+    return results, best_group
 
-    except FileNotFoundError:
-        best_group = {}
+_group_centroids = {}
 
-    return results, best_group
\ No newline at end of file
+def load_group_centroids(grouped_path: str, model_name: str = DEFAULT_MODEL_NAME) -> Tuple[list, np.ndarray]:
+    """
+    Группы из grouped_path и матрица их центроидов (среднее эмбеддингов текстов группы).
+    Центроиды считаются один раз и сохраняются рядом в <grouped_path>.centroids.npz
+    вместе с sha256 файла групп и именем модели; при изменении файла пересчитываются.
+    В процессе результат запоминается до изменения mtime/размера файла.
+    """
+    stat = os.stat(grouped_path)
+    memo_key = (os.path.abspath(grouped_path), model_name)
+    cached = _group_centroids.get(memo_key)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1], cached[2]
+
+    with open(grouped_path, 'rb') as f:
+        content = f.read()
+    source_hash = hashlib.sha256(content).hexdigest()
+    grouped_ideas = json.loads(content)
+
+    cache_path = grouped_path + '.centroids.npz'
+    centroids = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as saved:
+            if str(saved['source_hash']) == source_hash and str(saved['model_name']) == model_name:
+                centroids = saved['centroids']
+
+    if centroids is None:
+        texts = [text for group in grouped_ideas for text in group['texts']]
+        embeddings = compute_embeddings(texts, model_name) if texts else np.empty((0, 0), dtype=np.float32)
+        dim = embeddings.shape[1] if len(texts) else 0
+        centroids = np.full((len(grouped_ideas), dim), np.nan, dtype=np.float32)
+        start = 0
+        for i, group in enumerate(grouped_ideas):
+            count = len(group['texts'])
+            if count:
+                centroids[i] = embeddings[start:start + count].mean(axis=0)
+            start += count
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, centroids=centroids, source_hash=source_hash, model_name=model_name)
+        os.replace(tmp_path, cache_path)
+
+    _group_centroids[memo_key] = ((stat.st_mtime_ns, stat.st_size), grouped_ideas, centroids)
+    return grouped_ideas, centroids
\ No newline at end of file
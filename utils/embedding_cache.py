@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from typing import Callable, List
+from utils.cache import LRUCache
+from db_config import CACHE_SETTINGS
+
+
+class EmbeddingCache:
+    """
+    Кэш эмбеддингов с адресацией по содержимому: ключ — sha256 от имени модели и очищенного текста.
+    - уровень 1: LRU в памяти на max_items векторов
+    - уровень 2 (если задан path): SQLite-файл, переживает перезапуски и повторные запуски init_db.py
+    - счётчики попаданий и промахов для подбора размера
+    """
+    def __init__(self, max_items: int = 10000, path: str | None = None):
+        self._memory = LRUCache(max_items)
+        self._lock = threading.Lock()
+        self._db = None
+        self.path = path or None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL
+                )
+            ''')
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def encode(self, texts: List[str], model_name: str, encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Эмбеддинги для texts: из кэша, а для промахов — через encode_fn(список_текстов)
+        (повторы внутри одного вызова кодируются один раз)
+        """
+        keys = [self.make_key(model_name, text) for text in texts]
+        found = self.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            encoded = encode_fn(list(missing.values()))
+            self.put_many(list(missing), encoded)
+            found.update(zip(missing, encoded))
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def get_many(self, keys: List[str]) -> dict:
+        """
+        Найденные в кэше векторы: {ключ: np.ndarray}
+        """
+        found = {}
+        disk_keys = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                disk_keys.append(key)
+        memory_hits = len(found)
+
+        if self._db is not None and disk_keys:
+            unique_keys = list(dict.fromkeys(disk_keys))
+            with self._lock:
+                for start in range(0, len(unique_keys), 500):
+                    part = unique_keys[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._memory.put(key, vector)
+
+        disk_hits = sum(1 for key in disk_keys if key in found)
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(disk_keys) - disk_hits
+        return found
+
+    def put_many(self, keys: List[str], vectors) -> None:
+        vectors = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        for key, vector in zip(keys, vectors):
+            self._memory.put(key, vector)
+
+        if self._db is not None:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_items": len(self._memory),
+            "memory_max_items": self._memory.maxsize,
+            "persistent_path": self.path,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None
+        }
+
+
+embedding_cache = EmbeddingCache(**CACHE_SETTINGS)
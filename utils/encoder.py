@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import List
+from utils.model_registry import model_registry, DEFAULT_MODEL_NAME
+from utils.embedding_cache import embedding_cache
+
+
+class EncodeServiceStopped(RuntimeError):
+    """
+    Сервис кодирования не запущен или остановлен: текст нужно кодировать напрямую
+    """
+
+
+class EncodeService:
+    """
+    Кодирование текстов в отдельном потоке с динамическими микро-батчами:
+    - каждый вызов submit() кладёт текст в очередь и сразу получает Future
+    - поток-обработчик собирает одновременные запросы в батч до max_batch_size текстов,
+      ожидая новые не дольше max_wait_ms после первого, и кодирует их одним вызовом модели
+    - после stop() новые тексты не принимаются, а не обработанные к остановке
+      завершаются исключением EncodeServiceStopped
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._accepting = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, max_batch_size: int | None = None, max_wait_ms: float | None = None):
+        if max_batch_size is not None:
+            self.max_batch_size = max_batch_size
+        if max_wait_ms is not None:
+            self.max_wait_ms = max_wait_ms
+        with self._lock:
+            if not self.running:
+                self._thread = threading.Thread(target=self._run, name="encode-service", daemon=True)
+                self._thread.start()
+            self._accepting = True
+
+    def stop(self, timeout=None):
+        with self._lock:
+            # сигнал остановки встаёт в очередь последним: submit() после него не проходит
+            self._accepting = False
+            if self.running:
+                self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, text: str) -> Future:
+        """
+        Постановка текста в очередь; результат Future — эмбеддинг np.ndarray
+        """
+        future = Future()
+        with self._lock:
+            if not self._accepting:
+                raise EncodeServiceStopped("Сервис кодирования не запущен")
+            self._queue.put((text, future))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Синхронное кодирование через очередь: тексты попадают в общие микро-батчи
+        """
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def _collect_batch(self, first) -> tuple[list, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(EncodeServiceStopped("Сервис кодирования остановлен"))
+
+    def _run(self):
+        try:
+            self._process()
+        finally:
+            self._fail_pending()
+
+    def _process(self):
+        stopped = False
+        while not stopped:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopped = self._collect_batch(first)
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                model = model_registry.get(self.model_name)
+                embeddings = model.encode(
+                    [text for text, _ in batch],
+                    batch_size=len(batch),
+                    convert_to_numpy=True
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+encode_service = EncodeService()
+
+
+def encode_query(text: str, model_name: str = DEFAULT_MODEL_NAME) -> np.ndarray:
+    """
+    Эмбеддинг одного текста запроса: через сервис микро-батчей, если он запущен
+    для этой модели, иначе напрямую (в том числе если сервис остановился во время запроса);
+    повторные запросы берутся из кэша
+    """
+    def encode(missing):
+        if encode_service.running and encode_service.model_name == model_name:
+            try:
+                return [encode_service.submit(missing[0]).result()]
+            except EncodeServiceStopped:
+                pass
+        model = model_registry.get(model_name)
+        return model.encode(missing, convert_to_numpy=True)
+
+    return embedding_cache.encode([text], model_name, encode)[0]
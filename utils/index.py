@@ -0,0 +1,365 @@
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
+from typing import List, Tuple
+
+INDEX_BACKENDS = ('exact', 'hnsw')
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Приводит эмбеддинги к float32 и L2-нормирует построчно
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HnswSearcher:
+    """
+    Приближённый поиск ближайших соседей (HNSW, hnswlib) на CPU.
+    Каждой идее выдаётся постоянная метка, удаление — через mark_deleted,
+    освободившиеся места переиспользуются при вставке.
+    """
+    def __init__(self, dim: int, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("Для INDEX_BACKEND=hnsw нужен пакет hnswlib: pip install hnswlib") from e
+
+        self.ef_search = ef_search
+        self._index = hnswlib.Index(space='ip', dim=dim)
+        self._index.init_index(max_elements=1024, ef_construction=ef_construction, M=m,
+                               allow_replace_deleted=True)
+        self._labels = {}
+        self._ids_by_label = {}
+        self._next_label = 0
+
+    def add(self, idea_ids: List[str], vectors: np.ndarray) -> None:
+        labels = []
+        for idea_id in idea_ids:
+            label = self._labels.get(idea_id)
+            if label is None:
+                label = self._next_label
+                self._next_label += 1
+                self._labels[idea_id] = label
+                self._ids_by_label[label] = idea_id
+            labels.append(label)
+
+        required = self._index.get_current_count() + len(labels)
+        if required > self._index.get_max_elements():
+            self._index.resize_index(max(required, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, np.asarray(labels), replace_deleted=True)
+
+    def remove(self, idea_id: str) -> None:
+        label = self._labels.pop(idea_id, None)
+        if label is not None:
+            del self._ids_by_label[label]
+            self._index.mark_deleted(label)
+
+    def query(self, vector: np.ndarray, k: int) -> List[str]:
+        k = min(k, len(self._labels))
+        if k == 0:
+            return []
+        self._index.set_ef(max(self.ef_search, k))
+        labels, _ = self._index.knn_query(vector, k=k)
+        return [self._ids_by_label[label] for label in labels[0]]
+
+
+class EmbeddingIndex:
+    """
+    Резидентный индекс эмбеддингов идей:
+    - матрица L2-нормированных float32 векторов (строка = идея)
+    - отображение idea_id → номер строки
+    - запрос = одно матрично-векторное произведение без обращения к БД
+    - backend='hnsw' включает приближённый поиск топ-N (HNSW), точные сходства
+      для найденных кандидатов всё равно считаются по матрице
+    """
+    def __init__(self, backend: str = 'exact', hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200, hnsw_ef_search: int = 64):
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Неизвестный backend индекса: {backend}, допустимые: {INDEX_BACKENDS}")
+        self.backend = backend
+        self._hnsw_params = {
+            "m": hnsw_m,
+            "ef_construction": hnsw_ef_construction,
+            "ef_search": hnsw_ef_search
+        }
+        self._ann = None
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._size = 0
+        self._ids = []
+        self._texts = []
+        self._id_to_row = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, idea_id) -> bool:
+        return str(idea_id) in self._id_to_row
+
+    def build(self, idea_ids: List[str], texts: List[str], embeddings) -> None:
+        """
+        Полное построение индекса
+        """
+        with self._lock:
+            self._vectors = None
+            self._ann = None
+            self._size = 0
+            self._ids = []
+            self._texts = []
+            self._id_to_row = {}
+            if len(idea_ids):
+                self.upsert(idea_ids, texts, embeddings)
+
+    def upsert(self, idea_ids: List[str], texts: List[str], embeddings) -> None:
+        """
+        Добавление новых или замена существующих векторов
+        """
+        vectors = normalize_rows(embeddings)
+        with self._lock:
+            self._reserve(self._size + len(idea_ids), vectors.shape[1])
+            for idea_id, text, vector in zip(idea_ids, texts, vectors):
+                idea_id = str(idea_id)
+                row = self._id_to_row.get(idea_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(idea_id)
+                    self._texts.append(text)
+                    self._id_to_row[idea_id] = row
+                else:
+                    self._texts[row] = text
+                self._vectors[row] = vector
+
+            if self._ann is not None:
+                self._ann.add([str(i) for i in idea_ids], vectors)
+
+    def remove(self, idea_id: str) -> bool:
+        """
+        Удаление вектора: последняя строка переносится на место удалённой
+        """
+        idea_id = str(idea_id)
+        with self._lock:
+            row = self._id_to_row.pop(idea_id, None)
+            if row is None:
+                return False
+            if self._ann is not None:
+                self._ann.remove(idea_id)
+
+            last = self._size - 1
+            if row != last:
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = self._ids[last]
+                self._texts[row] = self._texts[last]
+                self._id_to_row[self._ids[row]] = row
+
+            self._ids.pop()
+            self._texts.pop()
+            self._size = last
+            return True
+
+    def get_vectors(self, idea_ids: List[str]) -> np.ndarray:
+        """
+        Нормированные векторы для тех idea_id, которые есть в индексе
+        """
+        with self._lock:
+            rows = [self._id_to_row[str(i)] for i in idea_ids if str(i) in self._id_to_row]
+            if not rows:
+                return np.empty((0, 0), dtype=np.float32)
+            return self._vectors[rows]
+
+    def search(self, query, top_n: int = 15, exact: bool = False) -> List[Tuple[str, str, float]]:
+        """
+        Топ-N ближайших идей по косинусному сходству: [(idea_id, полный_текст, сходство), ...]
+        exact=True — точный перебор даже при ANN-бэкенде
+        """
+        query = normalize_rows(query)[0]
+        with self._lock:
+            if self._size == 0 or top_n <= 0:
+                return []
+
+            if self._ann is not None and not exact:
+                rows = np.array([self._id_to_row[i] for i in self._ann.query(query, top_n)], dtype=np.intp)
+                similarities = self._vectors[rows] @ query
+                order = np.argsort(similarities)[::-1]
+                rows, similarities = rows[order], similarities[order]
+            else:
+                similarities = self._vectors[:self._size] @ query
+                top_n = min(top_n, self._size)
+                rows = np.argpartition(similarities, self._size - top_n)[self._size - top_n:]
+                rows = rows[np.argsort(similarities[rows])[::-1]]
+                similarities = similarities[rows]
+
+            return [
+                (self._ids[row], self._texts[row], float(similarity))
+                for row, similarity in zip(rows, similarities)
+            ]
+
+    def radius_search(self, query, min_similarity: float) -> List[str]:
+        """
+        idea_id всех идей со сходством не ниже min_similarity, по убыванию сходства
+        """
+        query = normalize_rows(query)[0]
+        with self._lock:
+            if self._size == 0:
+                return []
+            similarities = self._vectors[:self._size] @ query
+            rows = np.flatnonzero(similarities >= min_similarity)
+            rows = rows[np.argsort(similarities[rows])[::-1]]
+            return [self._ids[row] for row in rows]
+
+    def set_ef_search(self, ef_search: int) -> None:
+        """
+        Размер списка кандидатов HNSW при поиске: больше — выше recall, медленнее запрос
+        """
+        self._hnsw_params["ef_search"] = ef_search
+        if self._ann is not None:
+            self._ann.ef_search = ef_search
+
+    def _reserve(self, capacity: int, dim: int) -> None:
+        if self._vectors is None:
+            self._vectors = np.empty((max(capacity, 16), dim), dtype=np.float32)
+            if self.backend == 'hnsw':
+                self._ann = HnswSearcher(dim, **self._hnsw_params)
+        elif capacity > len(self._vectors):
+            grown = np.empty((max(capacity, 2 * len(self._vectors)), dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+
+def evaluate_recall(index: EmbeddingIndex, k: int = 15, n_queries: int = 200, seed: int = 0) -> dict:
+    """
+    Recall@k ANN-поиска относительно точного перебора.
+    Запросами служат случайные векторы самого индекса.
+    """
+    with index._lock:
+        vectors = index._vectors[:len(index)].copy()
+    if not len(vectors):
+        return {"k": k, "n_queries": 0, "recall": None}
+
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+
+    hits = 0
+    total = 0
+    exact_seconds = 0.0
+    ann_seconds = 0.0
+    for query in queries:
+        start_time = time.perf_counter()
+        exact_ids = {idea_id for idea_id, _, _ in index.search(query, k, exact=True)}
+        exact_seconds += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        ann_ids = {idea_id for idea_id, _, _ in index.search(query, k)}
+        ann_seconds += time.perf_counter() - start_time
+
+        hits += len(exact_ids & ann_ids)
+        total += len(exact_ids)
+
+    return {
+        "k": k,
+        "n_queries": len(queries),
+        "recall": round(hits / total, 4),
+        "exact_ms_per_query": round(1000 * exact_seconds / len(queries), 3),
+        "ann_ms_per_query": round(1000 * ann_seconds / len(queries), 3)
+    }
+
+
+def radius_neighbors_graph(vectors, max_distance: float, memory_limit_mb: float = 256,
+                           workers: int | None = None) -> sparse.csr_matrix:
+    """
+    Разреженный граф соседей по косинусному расстоянию: хранятся только пары
+    с расстоянием не больше max_distance (включая саму точку).
+    Матрица сходств считается блоками строк float32 так, чтобы блоки всех потоков
+    вместе занимали не больше memory_limit_mb; блоки обрабатываются параллельно
+    в workers потоках (numpy отпускает GIL на умножении матриц).
+    """
+    vectors = normalize_rows(vectors)
+    n = len(vectors)
+    workers = max(1, workers or os.cpu_count() or 1)
+    chunk_rows = max(1, int(memory_limit_mb * 1024 ** 2 / (workers * max(n, 1) * 4)))
+    min_similarity = np.float32(1 - max_distance)
+
+    def neighbours(start):
+        similarities = vectors[start:start + chunk_rows] @ vectors.T
+        rows, cols = np.nonzero(similarities >= min_similarity)
+        distances = np.maximum(1 - similarities[rows, cols], 0)
+        return rows + start, cols, distances
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(neighbours, range(0, n, chunk_rows)))
+
+    rows = np.concatenate([p[0] for p in parts]) if parts else np.empty(0, dtype=np.intp)
+    cols = np.concatenate([p[1] for p in parts]) if parts else np.empty(0, dtype=np.intp)
+    distances = np.concatenate([p[2] for p in parts]) if parts else np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((distances, (rows, cols)), shape=(n, n))
+
+
+class ClusterCentroids:
+    """
+    Нормированные центроиды подгрупп из таблицы clusters в одной матрице:
+    выбор лучшей группы — одно матрично-векторное произведение и argmax
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cluster_ids = []
+        self._members = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._cluster_ids)
+
+    def build(self, cluster_ids: List[str], members: List[list], centroids) -> None:
+        with self._lock:
+            self._cluster_ids = list(cluster_ids)
+            self._members = [list(m) for m in members]
+            self._matrix = normalize_rows(centroids) if len(cluster_ids) else np.empty((0, 0), dtype=np.float32)
+
+    def update(self, cluster_id: str, members: list, centroid) -> None:
+        """
+        Замена состава и центроида одной подгруппы (или добавление новой)
+        """
+        vector = normalize_rows(centroid)
+        with self._lock:
+            if cluster_id in self._cluster_ids:
+                pos = self._cluster_ids.index(cluster_id)
+                self._members[pos] = list(members)
+                self._matrix[pos] = vector[0]
+            else:
+                self._cluster_ids.append(cluster_id)
+                self._members.append(list(members))
+                self._matrix = vector if not len(self._matrix) else np.vstack([self._matrix, vector])
+
+    def remove(self, cluster_id: str) -> None:
+        with self._lock:
+            if cluster_id not in self._cluster_ids:
+                return
+            pos = self._cluster_ids.index(cluster_id)
+            del self._cluster_ids[pos]
+            del self._members[pos]
+            self._matrix = np.delete(self._matrix, pos, axis=0)
+
+    def best(self, query) -> Tuple[str, list, float] | None:
+        """
+        Ближайшая к запросу подгруппа: (cluster_id, idea_ids, сходство) или None
+        """
+        query = normalize_rows(query)[0]
+        with self._lock:
+            if not self._cluster_ids:
+                return None
+            scores = self._matrix @ query
+            pos = int(np.argmax(scores))
+            return self._cluster_ids[pos], self._members[pos], float(scores[pos])
+
+
+def compute_centroid(vectors) -> np.ndarray:
+    """
+    Нормированный центроид: среднее нормированных векторов, снова L2-нормированное
+    """
+    return normalize_rows(normalize_rows(vectors).mean(axis=0))[0]
@@ -1,6 +1,8 @@
 import os
 import json
 import tempfile
+import threading
+import time
 import pandas as pd
 import numpy as np
 from typing import List, Tuple
@@ -26,7 +28,8 @@ def json_save(
     df: pd.DataFrame,
     context: list | None,
     output_path: str,
-    embeddings: np.ndarray | None = None
+    embeddings: np.ndarray | None = None,
+    npy_path: str | None = None
 ) -> None:
     """
     Сохраняет JSONL-файл с записями вида:
@@ -36,6 +39,7 @@ def json_save(
     :param context: список контекстов (list[list[str]]) либо None
     :param output_path: путь к файлу
     :param embeddings: np.ndarray с эмбеддингами (опционально)
+    :param npy_path: если задан, эмбеддинги дополнительно сохраняются в бинарном виде (npy_save)
     """
     records = []
 
@@ -49,22 +53,76 @@ def json_save(
         for rec in records:
             f.write(json.dumps(rec, ensure_ascii=False) + '\n')
 
+    # индекс смещений прежнего файла больше не действителен, он перестроится при открытии
+    if os.path.exists(output_path + JsonlStore.INDEX_SUFFIX):
+        os.remove(output_path + JsonlStore.INDEX_SUFFIX)
+
+    if npy_path is not None and embeddings is not None:
+        npy_save(npy_path, df['idea_id'].tolist(), embeddings)
+
+def _npy_signature(stat: os.stat_result) -> list:
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def npy_save(path: str, idea_ids: List[str], embeddings: np.ndarray) -> None:
+    """
+    Бинарное хранилище эмбеддингов: матрица float32 в <path> (.npy)
+    и таблица idea_id → номер строки в <path>.ids.json вместе с подписью файла матрицы
+    (inode, размер, mtime): по ней npy_load проверяет, что оба файла из одного сохранения.
+    Файлы пишутся во временные и подменяются атомарно, открытые читателями отображения не ломаются.
+
+    :param path: путь к .npy-файлу
+    :param idea_ids: idea_id в порядке строк матрицы
+    :param embeddings: эмбеддинги (N, dim)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(idea_ids) != len(embeddings):
+        raise ValueError(f"Число idea_id ({len(idea_ids)}) не совпадает с числом эмбеддингов ({len(embeddings)})")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    matrix_fd, matrix_tmp = tempfile.mkstemp(dir=directory, suffix='.npy')
+    ids_fd, ids_tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(matrix_fd, 'wb') as f:
+        np.save(f, embeddings)
+        f.flush()
+        signature = _npy_signature(os.fstat(f.fileno()))
+    with os.fdopen(ids_fd, 'w', encoding='utf-8') as f:
+        json.dump({"matrix": signature, "idea_ids": list(idea_ids)}, f, ensure_ascii=False)
+
+    # матрица подменяется первой: таблица idea_id никогда не новее матрицы
+    os.replace(matrix_tmp, path)
+    os.replace(ids_tmp, path + '.ids.json')
+
+def npy_load(path: str, attempts: int = 5) -> Tuple[List[str], np.ndarray]:
+    """
+    Загружает (idea_ids, embeddings) из npy_save: матрица не читается в память,
+    а отображается (np.memmap только для чтения), так что процессы делят один page cache.
+    Если файлы подменяются npy_save во время чтения, чтение повторяется (до attempts раз).
+    """
+    for _ in range(attempts):
+        with open(path + '.ids.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        signature = _npy_signature(os.stat(path))
+        embeddings = np.load(path, mmap_mode='r')
+        idea_ids = data["idea_ids"]
+        if data["matrix"] == signature == _npy_signature(os.stat(path)):
+            break
+        time.sleep(0.01)
+    else:
+        raise ValueError(f"{path}: таблица idea_id не соответствует матрице эмбеддингов")
+
+    if len(idea_ids) != len(embeddings):
+        raise ValueError(f"{path}: таблица idea_id не соответствует матрице эмбеддингов")
+    return idea_ids, embeddings
+
 def json_load(path: str) -> Tuple[List[str], List[list], np.ndarray | None]:
     """
     Загружает idea_id, context и (если есть) embedding из JSONL.
     
     :returns: (idea_ids, contexts, embeddings) — embedding может быть None
+    :raises FileNotFoundError: если файла нет
     """
-    records = pd.read_json(path, lines=True)
-
-    idea_ids = records['idea_id'].tolist()
-    contexts = records['context'].tolist()
-    embeddings = None
-
-    if 'embedding' in records.columns:
-        embeddings = np.vstack(records['embedding'].values)
-
-    return idea_ids, contexts, embeddings
+    with _stores_lock:
+        return open_store(path).load()
 
 def json_update(
     path: str,
@@ -83,38 +141,310 @@ def json_update(
     :param mode: 'update' — изменить существующую запись, 'add' — добавить новую, если не найдена
     :raises ValueError: если запись не найдена при update, или уже существует при add
     """
-    found = False
-    temp_fd, temp_path = tempfile.mkstemp()
-
-    with os.fdopen(temp_fd, 'w', encoding='utf-8') as tmp_file:
-        with open(path, 'r', encoding='utf-8') as src_file:
-            for line in src_file:
-                record = json.loads(line)
-                if record.get('idea_id') == idea_id:
-                    if mode == 'update':
-                        if new_context is not None:
-                            record['context'] = new_context
-                        if new_embedding is not None:
-                            record['embedding'] = new_embedding
-                        found = True
-                    elif mode == 'add':
-                        raise ValueError(f"Запись с idea_id='{idea_id}' уже существует — нельзя добавить повторно.")
-                tmp_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    with _stores_lock:
+        store = open_store(path)
+        record = store.get(idea_id)
 
         if mode == 'add':
-            new_record = {'idea_id': idea_id}
-            if new_context is not None:
-                new_record['context'] = new_context
-            if new_embedding is not None:
-                new_record['embedding'] = new_embedding
-            tmp_file.write(json.dumps(new_record, ensure_ascii=False) + '\n')
-            found = True
+            if record is not None:
+                raise ValueError(f"Запись с idea_id='{idea_id}' уже существует — нельзя добавить повторно.")
+            record = {'idea_id': idea_id}
+        elif record is None:
+            raise ValueError(f"Запись с idea_id='{idea_id}' не найдена для обновления.")
+
+        if new_context is not None:
+            record['context'] = new_context
+        if new_embedding is not None:
+            record['embedding'] = new_embedding
+        store.put(record)
+
+def json_delete(path: str, idea_id: str) -> bool:
+    """
+    Удаляет запись по idea_id из JSONL-файла (дописывает отметку об удалении).
+
+    :returns: True, если запись была
+    """
+    with _stores_lock:
+        return open_store(path).delete(idea_id)
+
+
+_stores = {}
+_stores_lock = threading.RLock()
+
+def open_store(path: str) -> 'JsonlStore':
+    """
+    Открытый JsonlStore для path, общий на процесс: индекс читается один раз,
+    дальше каждое изменение — только дозапись. Если файлы изменили извне
+    (другой процесс, json_save), хранилище открывается заново.
+    """
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or not store.is_current():
+            store = _stores[key] = JsonlStore(path)
+        return store
+
+
+class JsonlStore:
+    """
+    JSONL-файл как журнал только на дозапись:
+    - изменение или добавление записи — одна строка в конец файла
+    - удаление — строка-отметка {"idea_id": ..., "deleted": true}
+    - рядом лежит индекс <path>.idx: idea_id → (смещение, длина) последней версии записи,
+      поэтому чтение одной записи — seek к ней, без разбора всего файла
+    - когда устаревших строк становится больше compact_ratio от файла, он переписывается (compact)
+    Файлы, сохранённые json_save, открываются как есть: индекс строится при первом открытии.
+    """
+    INDEX_SUFFIX = '.idx'
+
+    def __init__(self, path: str, compact_ratio: float = 0.5, compact_min_bytes: int = 1024 ** 2):
+        self.path = path
+        self.index_path = path + self.INDEX_SUFFIX
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._offsets = {}
+        self._live_bytes = 0
+        self._end = 0
+        self._signature = None
+        self._index_stale = False
+        self._open_index()
+        self._remember_signature()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _stat_signature(self) -> tuple:
+        signature = []
+        for path in (self.path, self.index_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _remember_signature(self) -> None:
+        self._signature = self._stat_signature()
+
+    def is_current(self) -> bool:
+        """
+        Файлы данных и индекса не менялись с последней операции этого объекта
+        """
+        return self._signature == self._stat_signature()
+
+    def __contains__(self, idea_id) -> bool:
+        return idea_id in self._offsets
+
+    def ids(self) -> List[str]:
+        return list(self._offsets)
+
+    def get(self, idea_id: str) -> dict | None:
+        """
+        Последняя версия записи или None, если записи нет или она удалена
+        """
+        position = self._offsets.get(idea_id)
+        if position is None:
+            return None
+        offset, length = position
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def put(self, record: dict) -> None:
+        """
+        Добавление или замена записи целиком (по record['idea_id'])
+        """
+        self._append(record['idea_id'], record)
+
+    def delete(self, idea_id: str) -> bool:
+        if idea_id not in self._offsets:
+            return False
+        self._append(idea_id, {'idea_id': idea_id, 'deleted': True})
+        return True
+
+    def records(self):
+        """
+        Актуальные записи в порядке добавления, одним последовательным чтением файла
+        """
+        live = {offset: idea_id for idea_id, (offset, _) in self._offsets.items()}
+        found = {}
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if offset in live:
+                    found[live[offset]] = json.loads(line)
+                offset += len(line)
+        for idea_id in self._offsets:
+            yield found[idea_id]
+
+    def load(self) -> Tuple[List[str], List[list], np.ndarray | None]:
+        """
+        (idea_ids, contexts, embeddings) — как json_load
+        """
+        idea_ids, contexts, embeddings = [], [], []
+        for record in self.records():
+            idea_ids.append(record['idea_id'])
+            contexts.append(record.get('context', []))
+            if 'embedding' in record:
+                embeddings.append(record['embedding'])
+        if not embeddings or len(embeddings) != len(idea_ids):
+            return idea_ids, contexts, None
+        return idea_ids, contexts, np.asarray(embeddings)
+
+    def export_npy(self, path: str) -> None:
+        """
+        Сохранение эмбеддингов актуальных записей через npy_save
+        """
+        idea_ids, _, embeddings = self.load()
+        if embeddings is None:
+            raise ValueError(f"{self.path}: не у всех записей есть embedding")
+        npy_save(path, idea_ids, embeddings)
+
+    def compact(self) -> None:
+        """
+        Переписывает файл только актуальными записями и строит индекс заново
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        data_fd, data_tmp = tempfile.mkstemp(dir=directory)
+        index_fd, index_tmp = tempfile.mkstemp(dir=directory)
+
+        offsets = {}
+        offset = 0
+        with os.fdopen(data_fd, 'wb') as data_file, os.fdopen(index_fd, 'w', encoding='utf-8') as index_file:
+            for record in self.records():
+                line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+                data_file.write(line)
+                offsets[record['idea_id']] = (offset, len(line))
+                index_file.write(json.dumps([record['idea_id'], offset, len(line), False], ensure_ascii=False) + '\n')
+                offset += len(line)
+
+        os.replace(data_tmp, self.path)
+        os.replace(index_tmp, self.index_path)
+        self._offsets = offsets
+        self._live_bytes = offset
+        self._end = offset
+        self._index_stale = False
+        self._remember_signature()
+
+    def _append(self, idea_id: str, record: dict) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if os.path.getsize(self.path) > self._end:
+            # строки, дописанные в файл после открытия, индексируются до обрезки хвоста
+            self._save_index(self._index_tail())
+
+        with open(self.path, 'r+b') as f:
+            # недописанная при сбое строка отбрасывается только здесь, непосредственно перед дозаписью
+            f.truncate(self._end)
+            if self._end:
+                f.seek(self._end - 1)
+                if f.read(1) != b'\n':
+                    # последняя запись файла без перевода строки
+                    f.seek(self._end)
+                    f.write(b'\n')
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+
+        entry = [idea_id, offset, len(line), record.get('deleted', False)]
+        self._apply(*entry)
+        if self._index_stale:
+            self._write_index()
+        else:
+            self._save_index([entry])
+        self._remember_signature()
+        self._maybe_compact()
+
+    def _apply(self, idea_id: str, offset: int, length: int, deleted: bool) -> None:
+        previous = self._offsets.get(idea_id)
+        if previous is not None:
+            self._live_bytes -= previous[1]
+        if deleted:
+            self._offsets.pop(idea_id, None)
+        else:
+            self._offsets[idea_id] = (offset, length)
+            self._live_bytes += length
+        self._end = max(self._end, offset + length)
+
+    def _maybe_compact(self) -> None:
+        dead_bytes = self._end - self._live_bytes
+        if dead_bytes >= self.compact_min_bytes and dead_bytes > self.compact_ratio * self._end:
+            self.compact()
+
+    def _open_index(self) -> None:
+        """
+        Чтение индекса; строки файла данных за последней проиндексированной дописываются в индекс
+        (файл без индекса или с индексом, отставшим после сбоя). Файл данных при открытии не меняется;
+        индекс, который нельзя записать (каталог только для чтения), строится только в памяти.
+        """
+        size = os.path.getsize(self.path)
+
+        index_size = valid_bytes = 0
+        if os.path.exists(self.index_path):
+            index_size = os.path.getsize(self.index_path)
+            with open(self.index_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self._apply(*json.loads(line))
+                    valid_bytes += len(line)
+
+        if size < self._end:
+            # индекс от другого файла: строится заново
+            self._offsets, self._live_bytes, self._end = {}, 0, 0
+            valid_bytes = 0
+        entries = self._index_tail() if size > self._end else []
+        if entries or valid_bytes < index_size:
+            self._save_index(entries, valid_bytes)
 
-    if not found:
-        os.remove(temp_path)
-        raise ValueError(f"Запись с idea_id='{idea_id}' не найдена для обновления.")
+    def _index_tail(self) -> list:
+        """
+        Индексирует в памяти строки файла данных за self._end и возвращает их записи индекса.
+        Последняя строка без перевода строки индексируется, если это целая запись
+        (файл сохранён другой программой), иначе это недописанная при сбое строка и она пропускается.
+        """
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(self._end)
+            offset = self._end
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    if line.endswith(b'\n'):
+                        raise
+                    break
+                entries.append([record['idea_id'], offset, len(line), record.get('deleted', False)])
+                offset += len(line)
 
-    os.replace(temp_path, path)
+        for entry in entries:
+            self._apply(*entry)
+        return entries
 
+    def _save_index(self, entries: list, valid_bytes: int | None = None) -> None:
+        """
+        Дозапись entries в индекс, предварительно обрезанный до valid_bytes.
+        Если индекс не записывается, он остаётся только в памяти и переписывается целиком
+        при следующей удачной дозаписи (_write_index)
+        """
+        try:
+            with open(self.index_path, 'ab') as f:
+                if valid_bytes is not None:
+                    f.truncate(valid_bytes)
+                f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8'))
+        except OSError:
+            self._index_stale = True
 
-    
\ No newline at end of file
+    def _write_index(self) -> None:
+        """
+        Индекс целиком по актуальным записям в памяти, с атомарной подменой файла
+        """
+        index_tmp = None
+        try:
+            index_fd, index_tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+            with os.fdopen(index_fd, 'w', encoding='utf-8') as f:
+                for idea_id, (offset, length) in self._offsets.items():
+                    f.write(json.dumps([idea_id, offset, length, False], ensure_ascii=False) + '\n')
+            os.replace(index_tmp, self.index_path)
+            self._index_stale = False
+        except OSError:
+            if index_tmp is not None and os.path.exists(index_tmp):
+                os.remove(index_tmp)
@@ -0,0 +1,121 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# длительности этапов текущего запроса для заголовка Server-Timing; None — не собираются
+_request_timings: ContextVar[list | None] = ContextVar('request_timings', default=None)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с метками в формате Prometheus:
+    по каждому набору меток — накопительные счётчики по границам buckets, сумма и число наблюдений
+    """
+    def __init__(self, name: str, documentation: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][position] += 1
+            series["sum"] += value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(data["counts"]), data["sum"]) for labels, data in sorted(self._series.items())]
+
+        for labels, counts, total in series:
+            label_text = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+stage_duration = Histogram(
+    'ideas_stage_duration_seconds',
+    'Длительность этапов обработки идей, с',
+    ('operation', 'stage')
+)
+request_duration = Histogram(
+    'ideas_http_request_duration_seconds',
+    'Длительность HTTP-запросов, с',
+    ('method', 'path', 'status')
+)
+
+
+@contextmanager
+def span(operation: str, stage: str):
+    """
+    Замер этапа operation/stage: длительность попадает в гистограмму stage_duration,
+    а если для запроса включён сбор, то и в заголовок Server-Timing
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start_time
+        stage_duration.observe((operation, stage), duration)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{operation}.{stage}", duration))
+
+
+def start_request_timing() -> list:
+    """
+    Включает сбор этапов для текущего запроса; список общий для потоков и задач,
+    в которые копируется контекст запроса
+    """
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: list, total: float | None = None) -> str:
+    """
+    Значение заголовка Server-Timing: этапы в миллисекундах, повторы одного этапа суммируются
+    """
+    merged = {}
+    for name, duration in timings:
+        merged[name] = merged.get(name, 0.0) + duration
+    if total is not None:
+        merged['total'] = total
+    return ', '.join(f"{name};dur={duration * 1000:.2f}" for name, duration in merged.items())
+
+
+def render_metrics() -> str:
+    """
+    Все метрики в текстовом формате Prometheus
+    """
+    lines = stage_duration.render() + request_duration.render()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+import resource
+import threading
+import time
+from sentence_transformers import SentenceTransformer
+
+DEFAULT_MODEL_NAME = 'cointegrated/LaBSE-en-ru'
+
+
+def _rss_mb() -> float:
+    """
+    Пиковый RSS процесса в МБ (ru_maxrss в Linux считается в КБ)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """
+    Реестр моделей SentenceTransformer на весь процесс:
+    - каждая модель загружается один раз и переиспользуется всеми путями кодирования
+    - хранит время загрузки и занимаемую память
+    """
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str = DEFAULT_MODEL_NAME) -> SentenceTransformer:
+        """
+        Возвращает загруженную модель, при первом обращении загружает её
+        """
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._load(model_name)
+        return model
+
+    def warmup(self, model_name: str = DEFAULT_MODEL_NAME) -> None:
+        """
+        Загрузка модели и пробное кодирование, чтобы первый запрос не платил за инициализацию
+        """
+        model = self.get(model_name)
+        model.encode(['прогрев модели'], convert_to_numpy=True)
+
+    def register(self, model_name: str, model) -> None:
+        """
+        Регистрация уже созданной модели под именем model_name (например, заглушки для бенчмарков):
+        достаточно метода encode(texts, **kwargs) -> np.ndarray
+        """
+        with self._lock:
+            self._models[model_name] = model
+            self._stats[model_name] = {
+                "load_seconds": 0.0,
+                "params_mb": 0.0,
+                "rss_delta_mb": 0.0,
+                "loaded_at": time.time()
+            }
+
+    def is_loaded(self, model_name: str = DEFAULT_MODEL_NAME) -> bool:
+        return model_name in self._models
+
+    def stats(self) -> dict:
+        """
+        Время загрузки и память по каждой загруженной модели
+        """
+        return {name: dict(stat) for name, stat in self._stats.items()}
+
+    def _load(self, model_name: str) -> SentenceTransformer:
+        rss_before = _rss_mb()
+        start_time = time.perf_counter()
+
+        model = SentenceTransformer(model_name)
+
+        load_seconds = time.perf_counter() - start_time
+        param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        self._stats[model_name] = {
+            "load_seconds": round(load_seconds, 3),
+            "params_mb": round(param_bytes / 1024 ** 2, 1),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+            "loaded_at": time.time()
+        }
+        self._models[model_name] = model
+
+        print(f"Модель {model_name} загружена за {load_seconds:.1f} с, "
+              f"параметры: {self._stats[model_name]['params_mb']} МБ")
+        return model
+
+
+model_registry = ModelRegistry()
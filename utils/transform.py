@@ -1,23 +1,77 @@
 import pandas as pd
 import spacy
 import re
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
 from tqdm import tqdm
+from utils.cache import LRUCache
+from db_config import SPACY_SETTINGS
 
 nlp = spacy.load("ru_core_news_lg")
 
+
+def _ner_components(nlp) -> list[str]:
+    """
+    Компоненты, нужные для NER: сам ner и tok2vec, если ner слушает общий tok2vec
+    """
+    components = ['ner']
+    if 'tok2vec' in nlp.pipe_names and 'ner' in getattr(nlp.get_pipe('tok2vec'), 'listening_components', []):
+        components.insert(0, 'tok2vec')
+    return components
+
+
+# spaCy здесь нужен только для поиска организаций: остальные компоненты отключаются один раз
+nlp.select_pipes(enable=_ner_components(nlp))
+
+_org_cache = LRUCache(SPACY_SETTINGS['cache_size'])
+
+
+def detect_organizations(names: list[str], n_process: int = 1) -> dict:
+    """
+    Признак организации для каждой уникальной строки: {строка: bool}.
+    Результаты запоминаются, spaCy получает только ещё не встречавшиеся строки, батчами через nlp.pipe.
+    """
+    result = {}
+    missing = []
+    for name in dict.fromkeys(names):
+        is_org = _org_cache.get(name)
+        if is_org is None:
+            missing.append(name)
+        else:
+            result[name] = is_org
+
+    if missing:
+        batch_size = SPACY_SETTINGS['batch_size']
+        if len(missing) < batch_size * n_process:
+            n_process = 1
+        docs = nlp.pipe(missing, batch_size=batch_size, n_process=n_process)
+        for name, doc in zip(missing, docs):
+            is_org = any(ent.label_ == "ORG" for ent in doc.ents)
+            _org_cache.put(name, is_org)
+            result[name] = is_org
+    return result
+
+
 def filter_organizations_spacy(data: list[str]) -> list[str]:
     """
-    Возвращает только те строки из списка, которые spaCy распознаёт как не организации.
+    Возвращает только те строки из списка, которые spaCy распознаёт как организации.
 
     :param data: список строк
     :return: список строк, распознанных как организации
     """
-    def is_organization(name: str) -> bool:
-        doc = nlp(name)
-        return any(ent.label_ == "ORG" for ent in doc.ents)
+    is_org = detect_organizations(data)
+    return [x for x in data if is_org[x]]
+
 
-    return [x for x in data if is_organization(x)]
+def filter_organizations_spacy_batch(key_words_list: list[list], n_process: int | None = None) -> list[list]:
+    """
+    filter_organizations_spacy для ключевых слов множества текстов одним проходом spaCy.
+    n_process > 1 — разбор в нескольких процессах (для массовой загрузки).
+    """
+    if n_process is None:
+        n_process = SPACY_SETTINGS['n_process']
+    is_org = detect_organizations([w for key_words in key_words_list for w in key_words], n_process=n_process)
+    return [[w for w in key_words if is_org[w]] for key_words in key_words_list]
 
 def extract_duplicates_and_uniques(df_clusters):
     """
@@ -36,30 +90,105 @@ def extract_duplicates_and_uniques(df_clusters):
 def smart_grouping(token_lists, threshold=20):
     """
     Возвращает подгруппы, каждая из которых — список индексов token_lists, схожих по содержанию.
+    Жадный проход по порядку: первая непристроенная запись забирает все следующие
+    с коэффициентом Жаккара (в %) не ниже threshold. Кандидаты берутся из
+    инвертированного индекса слово → записи, поэтому сравниваются только записи с общими словами.
     """
-    def similarity(a, b):
-        set_a, set_b = set(a), set(b)
-        intersection = set_a & set_b
-        union = set_a | set_b
-        return 100 * len(intersection) / len(union) if union else 0.0
-
-    token_lists = [tokens if tokens else ['АРГЕС'] for tokens in token_lists]
-    used = [False] * len(token_lists)
+    token_sets = [set(tokens) if tokens else {'АРГЕС'} for tokens in token_lists]
+    used = [False] * len(token_sets)
     groups = []
 
-    for i, tokens in enumerate(token_lists):
+    if threshold <= 0:
+        return [list(range(len(token_sets)))] if token_sets else []
+
+    postings = {}
+    for i, tokens in enumerate(token_sets):
+        for token in tokens:
+            postings.setdefault(token, []).append(i)
+
+    for i, tokens in enumerate(token_sets):
         if used[i]:
             continue
-        group = [i]
         used[i] = True
-        for j in range(i + 1, len(token_lists)):
-            if not used[j] and similarity(tokens, token_lists[j]) >= threshold:
+
+        # число общих слов с каждым ещё свободным кандидатом (все свободные индексы > i)
+        shared = {}
+        for token in tokens:
+            candidates = [j for j in postings[token] if not used[j]]
+            postings[token] = candidates
+            for j in candidates:
+                shared[j] = shared.get(j, 0) + 1
+
+        group = [i]
+        for j in sorted(shared):
+            intersection = shared[j]
+            union = len(tokens) + len(token_sets[j]) - intersection
+            if 100 * intersection / union >= threshold:
                 group.append(j)
                 used[j] = True
         groups.append(group)
 
     return groups
 
+_WORD_RE = re.compile(r'\b[А-ЯA-ZЁё0-9][А-Яа-яA-Za-zЁё0-9\-\/\.\"()]{1,}\b')
+# даты, диапазоны, тарифы, суммы и отдельные числа — одна проверка вместо пяти
+_EXCLUDE_RE = re.compile(
+    r'(?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}[./-]\d{1,2}[./-]\d{1,2})'
+    r'|\b\d{1,4}[-/]\d{1,4}\b'
+    r'|(?i:\b\d{1,9}\s?(?:руб(?:лей|\.|)|р|₽)[/\\][а-яa-z0-9]+)'
+    r'|(?i:\b\d{1,9}(?:[ \u00A0]\d{3})*\s*(?:руб(?:лей|\.|)|р|₽)\b)'
+    r'|^\d+(?:[.,]\d+)?$'
+)
+_PLAIN_WORD_RE = re.compile(r'\w+')
+_SPECIAL_CHARS = frozenset('-/()."')
+
+
+@lru_cache(maxsize=4096)
+def _word_pattern(word: str) -> re.Pattern:
+    return re.compile(rf'\b{re.escape(word)}\b', re.IGNORECASE)
+
+
+def _key_words(text: str) -> list:
+    unique_filtered = {}
+    for w in _WORD_RE.findall(text):
+        if w in unique_filtered or _EXCLUDE_RE.fullmatch(w):
+            continue
+        has_digit = any(c.isdigit() for c in w)
+        if has_digit and w[-1].islower():
+            continue
+        if (len(w) >= 3 and w.isupper()) or has_digit or not _SPECIAL_CHARS.isdisjoint(w):
+            unique_filtered[w] = None
+    return list(unique_filtered)
+
+
+def _clean_text(text: str, key_words: list) -> str:
+    if not key_words:
+        return text
+    if all(_PLAIN_WORD_RE.fullmatch(word) for word in key_words):
+        # слова без знаков совпадают только целиком и не пересекаются — хватает одного прохода
+        pattern = rf'\b(?:{"|".join(map(re.escape, key_words))})\b'
+        return re.sub(pattern, '', text, flags=re.IGNORECASE)
+    for word in key_words:
+        text = _word_pattern(word).sub('', text)
+    return text
+
+
+def iter_key_words(texts: Iterable[str]) -> Iterator[list]:
+    """
+    Потоковый вариант get_key_words: ключевые слова по одному тексту
+    """
+    for text in texts:
+        yield _key_words(text)
+
+
+def iter_clean_text(texts: Iterable[str], key_words_list: Iterable[list]) -> Iterator[str]:
+    """
+    Потоковый вариант get_clean_text
+    """
+    for text, key_words in zip(texts, key_words_list):
+        yield _clean_text(text, key_words)
+
+
 def get_key_words(texts: List[str]) -> list[list]:
     """
     Извлекает уникальные ключевые слова из текста и возвращает их в список.
@@ -70,57 +199,13 @@ def get_key_words(texts: List[str]) -> list[list]:
     - Исключает отдельные числа, даты, суммы, тарифы и диапазоны.
     - Исключает слова с цифрами, если они заканчиваются на букву в нижнем регистре.
     """
-    org_pattern = r'(?:ООО|АО|ПАО|ЗАО|ОАО|ФГБУ|МУП|ГУП|ЧУП|ИП|ГТС ПАО|АВО|СТО)\s*["«][^"»]+?["»]'
-    word_pattern = r'\b[А-ЯA-ZЁё0-9][А-Яа-яA-Za-zЁё0-9\-\/\.\"()]{1,}\b'
-    date_pattern = r'(\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}[./-]\d{1,2}[./-]\d{1,2})'
-    number_pattern = r'^\d+([.,]\d+)?$'
-    money_pattern = r'\b\d{1,9}(?:[ \u00A0]\d{3})*\s*(?:руб(?:лей|\.|)|р|₽)\b'
-    tariff_pattern = r'\b\d{1,9}\s?(?:руб(?:лей|\.|)|р|₽)[/\\][а-яa-z0-9]+'
-    range_pattern = r'\b\d{1,4}[-/]\d{1,4}\b'
-
-    key_words_list = []
-    for text in texts:
-        found = re.findall(word_pattern, text)
-        filtered = []
-        for w in found:
-            if re.fullmatch(date_pattern, w):
-                continue
-            if re.fullmatch(range_pattern, w):
-                continue
-            if re.fullmatch(tariff_pattern, w, re.IGNORECASE):
-                continue
-            if re.fullmatch(money_pattern, w, re.IGNORECASE):
-                continue
-            if re.fullmatch(number_pattern, w): 
-                continue
-            if any(c.isdigit() for c in w) and w[-1].islower():
-                continue
-            if len(w) >= 3 and w.isupper():
-                filtered.append(w)
-                continue
-            if any(c.isdigit() for c in w) or any(c in w for c in '-/()."'):
-                filtered.append(w)
-                continue
-        all_words = filtered
-        seen = set()
-        unique_filtered = []
-        for w in all_words:
-            if w not in seen:
-                unique_filtered.append(w)
-                seen.add(w)
-        key_words_list.append(unique_filtered)
-    return key_words_list
+    return list(iter_key_words(texts))
 
 def get_clean_text(texts: List[str], key_words_list: list[list]) -> list[str]:
     """
     Очищает текст от ключевых слов.
     """
-    cleaned_texts = []
-    for text, key_words in zip(texts, key_words_list):
-        for word in key_words:
-            text = re.sub(rf'\b{re.escape(word)}\b', '', text, flags=re.IGNORECASE)
-        cleaned_texts.append(text)
-    return cleaned_texts
+    return list(iter_clean_text(texts, key_words_list))
 
 def is_sql_injection(input_str: str) -> bool:
     """